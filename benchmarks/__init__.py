@@ -0,0 +1 @@
+"""Benchmarks for the integration, run against a local mock API."""
@@ -0,0 +1,270 @@
+"""Local stand-in for mobileapi.luminus.be.
+
+Serves generated payloads for a configurable number of EANs, with optional
+latency, error rate and payload size. Run it on its own with
+
+    python -m benchmarks.mock_server --eans 100 --latency 50
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from aiohttp import web
+
+API = "/api/v11/"
+
+
+class MockLuminusApi:
+    """aiohttp application mimicking the My Luminus mobile API."""
+
+    def __init__(
+        self,
+        eans: int = 1,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        payload_size: int = 10,
+        seed: int = 0,
+    ) -> None:
+        """Latency and jitter are in milliseconds, payload_size is the number
+        of invoices and payments in the account statement."""
+        self.eans = [f"5414488200{index:08d}" for index in range(eans)]
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.payload_size = payload_size
+        self.requests: Counter[str] = Counter()
+        self._random = random.Random(seed)
+        self._runner: web.AppRunner | None = None
+
+        self.app = web.Application(middlewares=[self._middleware])
+        self.app.router.add_post("/token", self.token)
+        self.app.router.add_get(API + "GetBudgetBillLines", self.budget)
+        self.app.router.add_get(API + "GetAccountStatement", self.statements)
+        self.app.router.add_get(API + "GetContracts", self.contracts)
+        self.app.router.add_get(API + "GetMetersConsumptionSources", self.meters)
+        self.app.router.add_get(API + "GetConsumptions", self.consumptions)
+        self.app.router.add_get(API + "GetMetricsRange", self.metrics_range)
+        self.app.router.add_get(API + "GetAlerts", self.alerts)
+        self.app.router.add_post(API + "InsertMeterReading", self.no_content)
+        self.app.router.add_post(API + "DeleteMeterReading", self.no_content)
+        # discovered endpoints we don't model, an empty object is enough
+        self.app.router.add_get(API + "{name}", self.empty)
+
+    @property
+    def total_requests(self) -> int:
+        """Number of requests served since the last reset."""
+        return sum(self.requests.values())
+
+    def reset_counters(self) -> None:
+        """Start counting requests from zero."""
+        self.requests.clear()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving and return the base url to hand to the client."""
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        return f"http://{host}:{port}"
+
+    async def stop(self) -> None:
+        """Stop serving."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler) -> web.StreamResponse:
+        self.requests[request.path.rsplit("/", 1)[-1]] += 1
+        if self.latency or self.jitter:
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            await asyncio.sleep(delay / 1000)
+        if self.error_rate and self._random.random() < self.error_rate:
+            raise web.HTTPServiceUnavailable()
+        return await handler(request)
+
+    async def token(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        if form.get("grant_type") not in ("password", "refresh_token"):
+            raise web.HTTPBadRequest()
+        return web.json_response(
+            {
+                "access_token": "access-" + str(self._random.random()),
+                "token_type": "bearer",
+                "expires_in": 1199,
+                "refresh_token": "refresh-" + str(self._random.random()),
+            }
+        )
+
+    async def budget(self, request: web.Request) -> web.Response:
+        next_invoice = (date.today() + timedelta(days=10)).isoformat()
+        return web.json_response(
+            {
+                "Lines": [
+                    {
+                        "Ean": ean,
+                        "NextInvoiceDate": next_invoice,
+                        "Frequency": "Monthly",
+                        "CurrentAmount": 116.0,
+                        "Simulation": {
+                            "FromDate": "2023-05-01",
+                            "ToDate": "2024-05-31",
+                            "IdealAmount": 120.0,
+                            "MinimumAmount": 100.0,
+                            "MaximumAmount": 1200.0,
+                            "PaidAmount": 580.0,
+                            "EstimatedOpenAmount": 700.5,
+                            "EstimatedTotalAmount": 1480.5,
+                            "CurrentFinalInvoiceAmount": 0,
+                            "OpenInvoicesCount": 7,
+                            "PaidInvoicesCount": 5,
+                        },
+                        "IsEmptyHouse": False,
+                        "UpdateAmountAllowed": True,
+                        "UpdateFrequencyAllowed": True,
+                        "UpdateEmptyHouseAllowed": True,
+                        "IdealAmount": 192.0,
+                        "MinimumAmount": 117.0,
+                        "MaximumAmount": 1876.0,
+                        "CurrentSettlementAmount": 1755.0,
+                        "SubTotal": 1915.19,
+                        "OpenSlices": 10,
+                    }
+                    for ean in self.eans
+                ]
+            }
+        )
+
+    async def statements(self, request: web.Request) -> web.Response:
+        today = date.today()
+        return web.json_response(
+            {
+                "AmountOpen": {"Value": 116.0, "CurrencyCode": "EUR"},
+                "AmountOpenOnlinePaymentAllowed": False,
+                "InvoiceDownloadIsInMaintenance": False,
+                "Invoices": [
+                    {
+                        "InvoiceNumber": f"INV{index:08d}",
+                        "InvoiceDate": (today - timedelta(days=30 * index)).isoformat(),
+                        "DueDate": (
+                            today - timedelta(days=30 * index - 14)
+                        ).isoformat(),
+                        "Amount": {"Value": 116.0, "CurrencyCode": "EUR"},
+                        "OpenAmount": {"Value": 0, "CurrencyCode": "EUR"},
+                        "Status": "Paid",
+                    }
+                    for index in range(self.payload_size)
+                ],
+                "Payments": [
+                    {
+                        "PaymentId": f"PAY{index:08d}",
+                        "PaymentDate": (today - timedelta(days=30 * index)).isoformat(),
+                        "Amount": {"Value": 116.0, "CurrencyCode": "EUR"},
+                    }
+                    for index in range(self.payload_size)
+                ],
+            }
+        )
+
+    async def contracts(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            {
+                "Contracts": [
+                    {
+                        "Ean": ean,
+                        "EnergyType": "Electricity",
+                        "Product": "Comfy Plugin Pro",
+                        "PriceVariability": "Fixed",
+                        "EndDate": "2100-12-31",
+                    }
+                    for ean in self.eans
+                ],
+                "PendingContracts": [],
+            }
+        )
+
+    async def meters(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            {
+                "Meters": [
+                    {
+                        "Ean": ean,
+                        "EnergyType": "Electricity",
+                        "Sources": [{"SourceProvider": "LuminusSap"}],
+                    }
+                    for ean in self.eans
+                ]
+            }
+        )
+
+    async def consumptions(self, request: web.Request) -> web.Response:
+        date_from = datetime.fromisoformat(request.query["dateFrom"])
+        date_until = datetime.fromisoformat(request.query["dateUntil"])
+        step = {
+            "QuarterHour": timedelta(minutes=15),
+            "Hour": timedelta(hours=1),
+            "Day": timedelta(days=1),
+        }.get(request.query.get("periodicity", "Day"), timedelta(days=30))
+        periods = []
+        start = date_from
+        while start < date_until:
+            periods.append(
+                {
+                    "From": start.isoformat(),
+                    "Until": (start + step - timedelta(seconds=1)).isoformat(),
+                    "Value": round(
+                        self._random.uniform(0, step.total_seconds() / 9000), 3
+                    ),
+                }
+            )
+            start += step
+        return web.json_response({"Consumptions": periods})
+
+    async def metrics_range(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            {
+                "Ean": request.query.get("ean"),
+                "FirstDate": "2021-01-01T00:00:00",
+                "LastDate": datetime.now().replace(microsecond=0).isoformat(),
+            }
+        )
+
+    async def alerts(self, request: web.Request) -> web.Response:
+        return web.json_response({"Alerts": []})
+
+    async def empty(self, request: web.Request) -> web.Response:
+        return web.json_response({})
+
+    async def no_content(self, request: web.Request) -> web.Response:
+        return web.Response(status=204)
+
+
+def main() -> None:
+    """Serve the mock API until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--eans", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.0, help="ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="ms")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--payload-size", type=int, default=10)
+    args = parser.parse_args()
+
+    api = MockLuminusApi(
+        eans=args.eans,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        payload_size=args.payload_size,
+    )
+    web.run_app(api.app, host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
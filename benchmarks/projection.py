@@ -0,0 +1,127 @@
+"""Benchmark the cost projection engine on quarter hour consumption.
+
+    python -m benchmarks.projection --eans 1 5 20 --days 365
+
+Reports the time to write the memory mapped series, to recompute all
+projections and to append and recompute one more day per EAN.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "custom_components"))
+
+# pylint: disable=wrong-import-position
+from my_luminus_integration.consumption_store import to_epoch  # noqa: E402
+from my_luminus_integration.projection import (  # noqa: E402
+    MyLuminusProjectionEngine,
+)
+from my_luminus_integration.timeseries import MyLuminusSeriesStore  # noqa: E402
+
+QUARTER = 15 * 60
+PER_DAY = 24 * 3600 // QUARTER
+
+
+def _rows(start: int, count: int, rng: np.random.Generator) -> list[tuple]:
+    """Random quarter hour periods from start on."""
+    starts = start + np.arange(count, dtype=np.int64) * QUARTER
+    values = rng.gamma(2.0, 0.05, count)
+    return list(zip(starts.tolist(), (starts + QUARTER).tolist(), values.tolist()))
+
+
+def benchmark(directory: str, eans: int, days: int) -> dict:
+    """Load, recompute and append for one account size."""
+    rng = np.random.default_rng(0)
+    now = datetime(2024, 5, 1)
+    start = to_epoch("2023-05-01T00:00:00") - days * 24 * 3600
+    history = {str(ean): _rows(start, days * PER_DAY, rng) for ean in range(eans)}
+    budget = {
+        "Lines": [
+            {
+                "Ean": ean,
+                "CurrentAmount": 116.0,
+                "OpenSlices": 1,
+                "Simulation": {
+                    "FromDate": "2023-05-01",
+                    "ToDate": "2024-05-31",
+                    "IdealAmount": 120.0,
+                    "PaidAmount": 1320.0,
+                },
+            }
+            for ean in history
+        ]
+    }
+    contracts = {
+        "Contracts": [
+            {"Ean": ean, "PriceVariability": "Variable", "Product": "Benchmark"}
+            for ean in history
+        ]
+    }
+
+    engine = MyLuminusProjectionEngine()
+    store = MyLuminusSeriesStore(f"{directory}/{eans}")
+    series = {}
+    begin = time.perf_counter()
+    for ean, rows in history.items():
+        series[ean], _created = store.get(ean, "Electricity", "QuarterHour")
+        series[ean].extend(rows)
+        engine.load(ean, series[ean])
+    load = time.perf_counter() - begin
+    engine.set_inputs(budget, contracts)
+
+    begin = time.perf_counter()
+    engine.recompute(now)
+    recompute = time.perf_counter() - begin
+
+    end = start + days * PER_DAY * QUARTER
+    new_day = {ean: _rows(end, PER_DAY, rng) for ean in history}
+    begin = time.perf_counter()
+    for ean, rows in new_day.items():
+        series[ean].extend(rows)
+    engine.recompute(now)
+    incremental = time.perf_counter() - begin
+    store.close()
+
+    return {
+        "eans": eans,
+        "periods": days * PER_DAY * eans,
+        "load_ms": load * 1000,
+        "recompute_ms": recompute * 1000,
+        "append_day_ms": incremental * 1000,
+    }
+
+
+def main() -> None:
+    """Parse arguments, run and report."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--eans", type=int, nargs="+", default=[1, 5, 20])
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--json", action="store_true", help="print json instead")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        results = [benchmark(directory, eans, args.days) for eans in args.eans]
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            print(
+                "  ".join(
+                    f"{key}={value:.2f}"
+                    if isinstance(value, float)
+                    else f"{key}={value}"
+                    for key, value in result.items()
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Record real API traffic for replaying with benchmarks.run.
+
+    MY_LUMINUS_USERNAME=... MY_LUMINUS_PASSWORD=... \\
+        python -m benchmarks.record recording.json --cycles 3
+
+Runs full coordinator cycles against the live API and writes the exchanges
+with their timings. Tokens and EANs are redacted, other response fields are
+kept as is, so check a recording before sharing it.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import aiohttp
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "custom_components"))
+
+# pylint: disable=wrong-import-position
+from homeassistant import config_entries  # noqa: E402
+
+from my_luminus_integration.api import MyLuminusApiClient  # noqa: E402
+from my_luminus_integration.const import DOMAIN  # noqa: E402
+from my_luminus_integration.coordinator import MyLuminusCoordinator  # noqa: E402
+from my_luminus_integration.transport import (  # noqa: E402
+    MyLuminusAiohttpTransport,
+    MyLuminusRecordingTransport,
+)
+
+from .run import _async_run_cycle, _create_hass  # noqa: E402
+
+
+async def async_record(path: str, cycles: int) -> int:
+    """Record a number of full cycles, return the number of exchanges."""
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = _create_hass(config_dir)
+        config_entries.current_entry.set(
+            config_entries.ConfigEntry(
+                version=1,
+                domain=DOMAIN,
+                title="record",
+                data={},
+                source=config_entries.SOURCE_USER,
+            )
+        )
+        async with aiohttp.ClientSession() as session:
+            transport = MyLuminusRecordingTransport(
+                MyLuminusAiohttpTransport(session), path
+            )
+            client = MyLuminusApiClient(
+                username=os.environ["MY_LUMINUS_USERNAME"],
+                password=os.environ["MY_LUMINUS_PASSWORD"],
+                session=session,
+                transport=transport,
+            )
+            coordinator = MyLuminusCoordinator(hass=hass, client=client)
+            try:
+                for _ in range(cycles):
+                    await _async_run_cycle(coordinator, full=True)
+            finally:
+                await transport.async_save()
+        await hass.async_stop(force=True)
+    return len(transport.exchanges)
+
+
+def main() -> None:
+    """Parse arguments and record."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="file to write the recording to")
+    parser.add_argument("--cycles", type=int, default=3)
+    args = parser.parse_args()
+
+    exchanges = asyncio.run(async_record(args.path, args.cycles))
+    print(f"recorded {exchanges} exchanges to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""Benchmark the coordinator update cycle and sensor setup against the mock API.
+
+    python -m benchmarks.run --eans 1 100 10000 --cycles 20 --latency 20
+
+Reports per cycle latency percentiles, requests per cycle, allocations of a
+traced cycle and the time to create and render all sensor entities.
+
+    python -m benchmarks.run --replay recording.json --replay-speed 0
+
+Replays traffic captured with benchmarks.record instead of the mock API.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import aiohttp
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "custom_components"))
+
+# pylint: disable=wrong-import-position
+from homeassistant import config_entries  # noqa: E402
+from homeassistant.core import HomeAssistant  # noqa: E402
+
+from my_luminus_integration import sensor  # noqa: E402
+from my_luminus_integration.api import MyLuminusApiClient  # noqa: E402
+from my_luminus_integration.const import DOMAIN  # noqa: E402
+from my_luminus_integration.consumption_store import (  # noqa: E402
+    MyLuminusConsumptionStore,
+)
+from my_luminus_integration.coordinator import MyLuminusCoordinator  # noqa: E402
+from my_luminus_integration.scheduler import MyLuminusScheduler  # noqa: E402
+from my_luminus_integration.transport import (  # noqa: E402
+    MyLuminusReplayTransport,
+)
+
+from .mock_server import MockLuminusApi  # noqa: E402
+
+
+def _percentile(values: list[float], percent: float) -> float:
+    """Nearest rank percentile, fine for the handful of samples we take."""
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, round(percent / 100 * (len(ordered) - 1)))
+    return ordered[index]
+
+
+def _create_hass(config_dir: str) -> HomeAssistant:
+    """Bare Home Assistant instance, not started, enough for a coordinator."""
+    try:
+        hass = HomeAssistant(config_dir)
+    except TypeError:
+        # older cores take no arguments
+        hass = HomeAssistant()
+        hass.config.config_dir = config_dir
+    hass.config.language = "nl"
+    return hass
+
+
+def _request_count(
+    api: MockLuminusApi | None, transport: MyLuminusReplayTransport | None
+) -> int:
+    """Requests served so far."""
+    if api is None:
+        return transport.requests
+    return api.total_requests
+
+
+async def _async_run_cycle(coordinator: MyLuminusCoordinator, full: bool) -> None:
+    """Run one refresh, with all endpoints due when full is set."""
+    if full:
+        coordinator.scheduler = MyLuminusScheduler()
+    await coordinator.async_refresh()
+    # per meter coordinators run on their own timers, in a full cycle we
+    # refresh them all side by side
+    if full:
+        meters = coordinator.meter_coordinators.values()
+        await asyncio.gather(*(meter.async_refresh() for meter in meters))
+
+
+async def async_benchmark(
+    hass: HomeAssistant, entry: config_entries.ConfigEntry, eans: int, args
+) -> dict:
+    """Benchmark a single account size, or a recording."""
+    if args.replay:
+        api = None
+        transport = MyLuminusReplayTransport.load(args.replay, args.replay_speed)
+        base_url = "http://replay"
+    else:
+        api = MockLuminusApi(
+            eans=eans,
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            payload_size=args.payload_size,
+        )
+        transport = None
+        base_url = await api.start()
+    store = None
+    if not args.no_consumptions:
+        store = MyLuminusConsumptionStore(
+            str(Path(hass.config.config_dir) / f"consumption-{eans}.db")
+        )
+        store.open()
+
+    try:
+        async with aiohttp.ClientSession() as session:
+            client = MyLuminusApiClient(
+                username="benchmark@example.com",
+                password="benchmark",
+                session=session,
+                base_url=base_url,
+                transport=transport,
+            )
+            # cycles run back to back, unlike polls, don't let bursts hit the cache
+            client.result_ttl = 0
+            coordinator = MyLuminusCoordinator(
+                hass=hass, client=client, consumption_store=store
+            )
+            hass.data.setdefault(DOMAIN, {})[entry.entry_id] = coordinator
+
+            # warm up, logs in and fills the consumption store once
+            await _async_run_cycle(coordinator, full=True)
+
+            durations = []
+            requests = []
+            failures = 0
+            for _ in range(args.cycles):
+                counted = _request_count(api, transport)
+                start = time.perf_counter()
+                await _async_run_cycle(coordinator, full=not args.scheduled)
+                durations.append(time.perf_counter() - start)
+                requests.append(_request_count(api, transport) - counted)
+                failures += not coordinator.last_update_success
+
+            # allocations are measured apart, tracing skews the timings
+            tracemalloc.start()
+            await _async_run_cycle(coordinator, full=not args.scheduled)
+            _, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            allocated_blocks = sum(
+                stat.count for stat in snapshot.statistics("filename")
+            )
+
+            entities = []
+            start = time.perf_counter()
+            await sensor.async_setup_entry(hass, entry, entities.extend)
+            setup = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for entity in entities:
+                entity.native_value  # pylint: disable=pointless-statement
+            render = time.perf_counter() - start
+    finally:
+        hass.data.get(DOMAIN, {}).pop(entry.entry_id, None)
+        if store is not None:
+            store.close()
+        if api is not None:
+            await api.stop()
+
+    return {
+        "eans": len(coordinator.eans) if args.replay else eans,
+        "cycles": args.cycles,
+        "failed_cycles": failures,
+        "p50_ms": _percentile(durations, 50) * 1000,
+        "p90_ms": _percentile(durations, 90) * 1000,
+        "p99_ms": _percentile(durations, 99) * 1000,
+        "max_ms": max(durations) * 1000,
+        "requests_per_cycle": sum(requests) / len(requests),
+        "peak_alloc_kib": peak / 1024,
+        "live_blocks": allocated_blocks,
+        "entities": len(entities),
+        "entity_setup_ms": setup * 1000,
+        "entity_render_ms": render * 1000,
+    }
+
+
+async def async_main(args) -> list[dict]:
+    """Run the benchmark for every requested account size."""
+    results = []
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = _create_hass(config_dir)
+        entry = config_entries.ConfigEntry(
+            version=1,
+            domain=DOMAIN,
+            title="benchmark",
+            data={},
+            source=config_entries.SOURCE_USER,
+        )
+        config_entries.current_entry.set(entry)
+        for eans in args.eans:
+            results.append(await async_benchmark(hass, entry, eans, args))
+        await hass.async_stop(force=True)
+    return results
+
+
+def _print_table(results: list[dict]) -> None:
+    columns = list(results[0])
+    widths = [max(len(column), 10) for column in columns]
+    print("  ".join(column.rjust(width) for column, width in zip(columns, widths)))
+    for result in results:
+        print(
+            "  ".join(
+                (
+                    f"{value:.1f}" if isinstance(value, float) else str(value)
+                ).rjust(width)
+                for value, width in zip(result.values(), widths)
+            )
+        )
+
+
+def main() -> None:
+    """Parse arguments, run and report."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--eans", type=int, nargs="+", default=[1, 100, 10000])
+    parser.add_argument("--cycles", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=5.0, help="ms per request")
+    parser.add_argument("--jitter", type=float, default=0.0, help="ms per request")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--payload-size", type=int, default=10)
+    parser.add_argument(
+        "--scheduled",
+        action="store_true",
+        help="follow the polling schedule instead of fetching every endpoint",
+    )
+    parser.add_argument(
+        "--no-consumptions", action="store_true", help="skip the consumption sync"
+    )
+    parser.add_argument("--replay", help="replay a recording instead of the mock")
+    parser.add_argument(
+        "--replay-speed",
+        type=float,
+        default=1.0,
+        help="1 replays at recorded speed, 0 as fast as possible",
+    )
+    parser.add_argument("--json", action="store_true", help="print json instead")
+    args = parser.parse_args()
+    if args.replay:
+        # the recording decides the account size
+        args.eans = [0]
+
+    results = asyncio.run(async_main(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        _print_table(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,20 +6,69 @@ https://github.com/hanscappelle/my-luminus-integration
 
 from __future__ import annotations
 
+from functools import partial
+
+import voluptuous as vol
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import CONF_PASSWORD, CONF_USERNAME, Platform
-from homeassistant.core import HomeAssistant
-from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.core import HomeAssistant, ServiceCall, callback
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.start import async_at_started
+from homeassistant.helpers.storage import STORAGE_DIR, Store
+from homeassistant.util import dt as dt_util
 
-from .api import MyLuminusApiClient
-from .const import DOMAIN, LOGGER
+from .backfill import MyLuminusBackfill
+from .const import (
+    DOMAIN,
+    LOGGER,
+    SERVICE_PROFILE_CYCLE,
+    SERVICE_PUBLISH_METER_VALUES,
+)
+from .consumption_store import MyLuminusConsumptionStore
 from .coordinator import MyLuminusCoordinator
+from .outbox import MyLuminusOutbox
+from .profiling import MyLuminusProfiler
+from .registry import (
+    RESPONSE_CACHE_VERSION,
+    async_get_registry,
+    response_cache_key,
+)
+from .statement_index import MyLuminusStatementIndex
+from .statistics import MyLuminusStatisticsImporter
+from .timeseries import MyLuminusSeriesStore
 
 PLATFORMS: list[Platform] = [
     Platform.SENSOR,
 ]
 
+CACHE_VERSION = 1
+
+ATTR_EAN = "ean"
+ATTR_DATE = "date"
 ATTR_PAYLOAD = "payload"
+ATTR_CYCLES = "cycles"
+ATTR_INTERVAL = "interval"
+
+PUBLISH_METER_VALUES_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_EAN): cv.string,
+        vol.Optional(ATTR_DATE): cv.date,
+        vol.Optional(ATTR_PAYLOAD, default={}): dict,
+    }
+)
+
+PROFILE_CYCLE_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_CYCLES, default=1): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=10)
+        ),
+        # sampling interval in milliseconds
+        vol.Optional(ATTR_INTERVAL, default=5): vol.All(
+            vol.Coerce(float), vol.Range(min=1, max=100)
+        ),
+    }
+)
 
 
 # https://developers.home-assistant.io/docs/config_entries_index/#setting-up-an-entry
@@ -36,44 +85,187 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     password = entry.data.get(CONF_PASSWORD)
     LOGGER.debug("Loadded %s: ********", CONF_PASSWORD)
 
+    # local consumption history, synced incrementally by the coordinator
+    consumption_store = MyLuminusConsumptionStore(
+        hass.config.path(STORAGE_DIR, f"{DOMAIN}.{entry.entry_id}.db")
+    )
+    await hass.async_add_executor_job(consumption_store.open)
+    # invoices and payments are indexed in the same database
+    statement_index = MyLuminusStatementIndex(
+        hass.config.path(STORAGE_DIR, f"{DOMAIN}.{entry.entry_id}.db")
+    )
+    await hass.async_add_executor_job(statement_index.open)
+    # and kept as memory mapped arrays per meter for reading ranges
+    series_store = MyLuminusSeriesStore(
+        hass.config.path(STORAGE_DIR, f"{DOMAIN}.{entry.entry_id}.series")
+    )
+
+    # accounts share a connection pool and rate limit, logins share a token
+    client = async_get_registry(hass).async_get_client(
+        entry.entry_id, username, password
+    )
+
     # Initialize the HASS structure
     hass.data.setdefault(DOMAIN, {})
     hass.data[DOMAIN][entry.entry_id] = coordinator = MyLuminusCoordinator(
         hass=hass,
-        client=MyLuminusApiClient(
-            username=username,
-            password=password,
-            session=async_get_clientsession(hass),
-        ),
+        client=client,
+        consumption_store=consumption_store,
+        cache=Store(hass, CACHE_VERSION, f"{DOMAIN}.{entry.entry_id}.snapshot"),
+        statement_index=statement_index,
+        series_store=series_store,
     )
+    await coordinator.async_load_latest_statements()
+    # consumption shows up in the energy dashboard as external statistics
+    coordinator.statistics = MyLuminusStatisticsImporter(hass)
 
-    # add a service from this integration to push meter values
-    hass.services.register(DOMAIN, "publish_meter_values", handle_new_meter_values)
+    # Initiate the coordinator. Start from the last known data when we have it,
+    # otherwise this will login to the API and wait for the first data
+    try:
+        restored = await coordinator.async_restore()
+        if not restored:
+            # https://developers.home-assistant.io/docs/integration_fetching_data#coordinated-single-api-poll-for-data-for-all-entities
+            await coordinator.async_config_entry_first_refresh()
+    except Exception:
+        # setup is retried from scratch, don't leave connections behind
+        hass.data[DOMAIN].pop(entry.entry_id)
+        await _async_close(hass, entry, coordinator)
+        raise
 
-    # Initiate the coordinator. This method will also make sure to login to the API
+    # readings pushed by the service are queued and submitted in the background
+    coordinator.outbox = MyLuminusOutbox(hass, client, entry.entry_id)
+    await coordinator.outbox.async_load()
 
-    # https://developers.home-assistant.io/docs/integration_fetching_data#coordinated-single-api-poll-for-data-for-all-entities
-    await coordinator.async_config_entry_first_refresh()
+    # add a service from this integration to push meter values
+    if not hass.services.has_service(DOMAIN, SERVICE_PUBLISH_METER_VALUES):
+        hass.services.async_register(
+            DOMAIN,
+            SERVICE_PUBLISH_METER_VALUES,
+            partial(handle_new_meter_values, hass),
+            schema=PUBLISH_METER_VALUES_SCHEMA,
+        )
+    if not hass.services.has_service(DOMAIN, SERVICE_PROFILE_CYCLE):
+        hass.services.async_register(
+            DOMAIN,
+            SERVICE_PROFILE_CYCLE,
+            partial(handle_profile_cycle, hass),
+            schema=PROFILE_CYCLE_SCHEMA,
+        )
 
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
     entry.async_on_unload(entry.add_update_listener(async_reload_entry))
 
+    if restored:
+        # entities show cached data already, revalidate in the background
+        hass.async_create_task(coordinator.async_refresh())
+
+    # fetch older consumption history once Home Assistant is up
+    coordinator.backfill = MyLuminusBackfill(hass, coordinator)
+
+    @callback
+    def _async_start_backfill(_hass: HomeAssistant) -> None:
+        coordinator.backfill.async_start()
+
+    entry.async_on_unload(async_at_started(hass, _async_start_backfill))
+
     return True
 
 
-async def handle_new_meter_values(call: any) -> bool:
-    payload = call.data.get(ATTR_PAYLOAD, {})
-    hass.client
+def _coordinators(hass: HomeAssistant) -> list[MyLuminusCoordinator]:
+    """Coordinators of all loaded config entries."""
+    return [
+        coordinator
+        for coordinator in hass.data.get(DOMAIN, {}).values()
+        if isinstance(coordinator, MyLuminusCoordinator)
+    ]
+
+
+async def handle_new_meter_values(hass: HomeAssistant, call: ServiceCall) -> None:
+    """Queue a meter reading, submitting happens in the background."""
+    ean = call.data[ATTR_EAN]
+    day = call.data.get(ATTR_DATE) or dt_util.now().date()
+
+    # route the reading to the account that has this EAN
+    coordinators = _coordinators(hass)
+    if not coordinators:
+        raise HomeAssistantError("No My Luminus account configured")
+    coordinator = next(
+        (coordinator for coordinator in coordinators if ean in coordinator.eans),
+        None,
+    )
+    if coordinator is None:
+        raise HomeAssistantError(f"No My Luminus account has EAN {ean}")
+    coordinator.outbox.async_enqueue(ean, day, call.data[ATTR_PAYLOAD])
+
+
+async def handle_profile_cycle(hass: HomeAssistant, call: ServiceCall) -> None:
+    """Run cycles of all accounts under the profiler, then write a report."""
+    coordinators = _coordinators(hass)
+    if not coordinators:
+        raise HomeAssistantError("No My Luminus account configured")
+    if any(coordinator.profiler is not None for coordinator in coordinators):
+        raise HomeAssistantError("Already profiling")
+
+    profiler = MyLuminusProfiler(call.data[ATTR_INTERVAL] / 1000)
+    profiler.start()
+    for coordinator in coordinators:
+        coordinator.profiler = profiler
+    try:
+        for _ in range(call.data[ATTR_CYCLES]):
+            for coordinator in coordinators:
+                # a cycle fetches whatever is due, profile all endpoints
+                coordinator.scheduler.make_due()
+                await coordinator.async_refresh()
+    finally:
+        for coordinator in coordinators:
+            coordinator.profiler = None
+        await hass.async_add_executor_job(profiler.stop)
+
+    paths = await hass.async_add_executor_job(
+        profiler.write,
+        hass.config.path(f"{DOMAIN}_profile_{dt_util.now():%Y%m%d_%H%M%S}"),
+    )
+    LOGGER.info("Profile of %s cycles written to %s", call.data[ATTR_CYCLES], paths)
 
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Handle removal of an entry."""
     if unloaded := await hass.config_entries.async_unload_platforms(entry, PLATFORMS):
-        hass.data[DOMAIN].pop(entry.entry_id)
+        coordinator = hass.data[DOMAIN].pop(entry.entry_id)
+        coordinator.backfill.async_cancel()
+        await coordinator.outbox.async_shutdown()
+        await _async_close(hass, entry, coordinator)
+        if not _coordinators(hass):
+            hass.services.async_remove(DOMAIN, SERVICE_PUBLISH_METER_VALUES)
+            hass.services.async_remove(DOMAIN, SERVICE_PROFILE_CYCLE)
     return unloaded
 
 
+async def _async_close(
+    hass: HomeAssistant, entry: ConfigEntry, coordinator: MyLuminusCoordinator
+) -> None:
+    """Close the stores of an entry and release its client."""
+    # meter refreshes write to the stores, let them finish first
+    await coordinator.async_stop_refreshes()
+    await hass.async_add_executor_job(coordinator.consumption_store.close)
+    await hass.async_add_executor_job(coordinator.statement_index.close)
+    await hass.async_add_executor_job(coordinator.series_store.close)
+    await async_get_registry(hass).async_release(
+        entry.entry_id, entry.data.get(CONF_USERNAME)
+    )
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Remove the cached data, it holds a refresh token."""
+    await Store(
+        hass, CACHE_VERSION, f"{DOMAIN}.{entry.entry_id}.snapshot"
+    ).async_remove()
+    # cached responses of the login, the next setup fetches them again
+    await Store(
+        hass, RESPONSE_CACHE_VERSION, response_cache_key(entry.data[CONF_USERNAME])
+    ).async_remove()
+
+
 async def async_reload_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
     """Reload config entry."""
-    await async_unload_entry(hass, entry)
-    await async_setup_entry(hass, entry)
+    await hass.config_entries.async_reload(entry.entry_id)
@@ -3,11 +3,43 @@ from __future__ import annotations
 
 import asyncio
 import socket
+import time
+from collections.abc import Callable
+from datetime import datetime
+from functools import partial
+from typing import TYPE_CHECKING
+from urllib.parse import urlencode
 
 import aiohttp
 import async_timeout
 
-from .const import LOGGER
+from .const import (
+    API_BASE_URL,
+    COALESCE_RESULT_SECONDS,
+    ENDPOINT_TIMEOUT_SECONDS,
+    HEDGE_MIN_REQUESTS,
+    HEDGE_PERCENTILE,
+    LOGGER,
+    REQUEST_TIMEOUT_SECONDS,
+)
+from .cache import MyLuminusResponseCache
+from .decode import decode_response
+from .metrics import MyLuminusMetrics, endpoint_name
+from .resilience import (
+    MyLuminusCircuitBreaker,
+    MyLuminusRetryPolicy,
+    deadline,
+    parse_retry_after,
+    remaining_budget,
+)
+from .transport import (
+    MyLuminusAiohttpTransport,
+    MyLuminusResponseTooLargeError,
+    MyLuminusTransport,
+)
+
+if TYPE_CHECKING:
+    from .registry import MyLuminusRateLimiter
 
 
 class MyLuminusApiClientError(Exception):
@@ -17,11 +49,93 @@ class MyLuminusApiClientError(Exception):
 class MyLuminusApiClientCommunicationError(MyLuminusApiClientError):
     """Exception to indicate a communication error."""
 
+    def __init__(self, message: str, retry_after: float | None = None) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class MyLuminusApiClientUnavailableError(MyLuminusApiClientCommunicationError):
+    """Exception to indicate calls are held back while the API is failing."""
+
+
+class MyLuminusApiClientDeadlineError(MyLuminusApiClientCommunicationError):
+    """Exception to indicate the time budget of a refresh ran out."""
+
 
 class MyLuminusApiClientAuthenticationError(MyLuminusApiClientError):
     """Exception to indicate an authentication error."""
 
 
+class MyLuminusTokenManager:
+    """Keeps an access token around until shortly before it expires.
+
+    Renewal uses the refresh_token grant first and only falls back to a full
+    password login when that fails. Concurrent callers share a single renewal.
+    """
+
+    def __init__(self, client: MyLuminusApiClient, expiry_margin: int = 60) -> None:
+        self._client = client
+        self._expiry_margin = expiry_margin
+        self._access_token: str | None = None
+        self._refresh_token: str | None = None
+        self._expires_at = 0.0
+        self._renewal: asyncio.Future | None = None
+
+    @property
+    def refresh_token(self) -> str | None:
+        """Return the current refresh token, if any."""
+        return self._refresh_token
+
+    def restore(self, refresh_token: str | None) -> None:
+        """Reuse a refresh token kept from a previous run."""
+        if refresh_token and self._refresh_token is None:
+            self._refresh_token = refresh_token
+
+    def invalidate(self, token: str | None = None) -> None:
+        """Forget the access token so the next call renews it.
+
+        Pass the token the server refused, a newer one is then kept.
+        """
+        if token is not None and token != self._access_token:
+            return
+        self._access_token = None
+        self._expires_at = 0.0
+
+    async def async_get_token(self) -> str:
+        """Return a valid access token, renewing it when needed."""
+        if self._access_token and time.monotonic() < self._expires_at:
+            return self._access_token
+        if self._renewal is None:
+            self._renewal = asyncio.ensure_future(self._async_renew())
+        # shield so a cancelled caller doesn't abort the renewal for the others
+        return await asyncio.shield(self._renewal)
+
+    async def _async_renew(self) -> str:
+        """Renew the token with the refresh grant, or login again."""
+        try:
+            response = None
+            if self._refresh_token:
+                try:
+                    response = await self._client.refresh(self._refresh_token)
+                except MyLuminusApiClientError as exception:
+                    LOGGER.debug(
+                        "token refresh failed, logging in again: %s", exception
+                    )
+            if response is None:
+                response = await self._client.token()
+            self._store(response)
+            return self._access_token
+        finally:
+            self._renewal = None
+
+    def _store(self, response: dict) -> None:
+        """Keep the tokens from a /token response."""
+        self._access_token = response["access_token"]
+        self._refresh_token = response.get("refresh_token", self._refresh_token)
+        expires_in = int(response.get("expires_in", 0))
+        self._expires_at = time.monotonic() + max(expires_in - self._expiry_margin, 0)
+
+
 class MyLuminusApiClient:
     """Starcom API"""
 
@@ -30,10 +144,48 @@ class MyLuminusApiClient:
         username: str,
         password: str,
         session: aiohttp.ClientSession,
+        base_url: str = API_BASE_URL,
+        limiter: MyLuminusRateLimiter | None = None,
+        circuit: MyLuminusCircuitBreaker | None = None,
+        transport: MyLuminusTransport | None = None,
+        cache: MyLuminusResponseCache | None = None,
     ) -> None:
         self._username = username
         self._password = password
-        self._session = session
+        # record or replay traffic by passing another transport
+        self.transport = transport or MyLuminusAiohttpTransport(session)
+        self._base_url = base_url
+        self._limiter = limiter
+        self.tokens = MyLuminusTokenManager(self)
+        self.metrics = MyLuminusMetrics()
+        self.retry_policy = MyLuminusRetryPolicy()
+        self.circuit = circuit if circuit is not None else MyLuminusCircuitBreaker()
+        # single flight GETs and their recent results, see _api_wrapper
+        self._in_flight: dict[tuple, asyncio.Future] = {}
+        self._results: dict[tuple, tuple[float, any]] = {}
+        self.result_ttl = COALESCE_RESULT_SECONDS
+        # longer lived responses of endpoints that rarely change
+        self.cache = cache
+        self._revalidating: dict[tuple, asyncio.Task] = {}
+        self._revalidated_listeners: list[Callable[[str], None]] = []
+        # latency percentile after which a GET is sent again, None to never
+        self.hedge_percentile: float | None = HEDGE_PERCENTILE
+
+    def async_listen_revalidated(
+        self, listener: Callable[[str], None]
+    ) -> Callable[[], None]:
+        """Call listener with the endpoint when a background refresh changed
+        a cached response, returns a function to stop listening."""
+        self._revalidated_listeners.append(listener)
+        return partial(self._revalidated_listeners.remove, listener)
+
+    def has_password(self, password: str) -> bool:
+        """Return True when the client logs in with this password."""
+        return self._password == password
+
+    async def async_get_access_token(self) -> str:
+        """Return a cached access token, only logging in when it expired."""
+        return await self.tokens.async_get_token()
 
     async def token(self) -> any:
         """
@@ -55,7 +207,7 @@ class MyLuminusApiClient:
         """
         return await self._api_wrapper(
             method="POST",
-            url="https://mobileapi.luminus.be/token",
+            url=self._base_url + "/token",
             # this call doesn't take json but url encoded form data
             headers={
                 "Content-Type": "application/x-www-form-urlencoded",
@@ -64,9 +216,32 @@ class MyLuminusApiClient:
             + self._username
             + "&password="
             + self._password,
+            # logging in again has no side effects, a refresh token is used up
+            idempotent=True,
+        )
+
+    async def refresh(self, refresh_token: str) -> any:
+        """
+        renew the access token without sending the password again
+
+        POST https://mobileapi.luminus.be/token
+
+        grant_type=refresh_token&refresh_token=CURRENT_REFRESH_TOKEN
+
+        same response as the password grant
+        """
+        return await self._api_wrapper(
+            method="POST",
+            url=self._base_url + "/token",
+            headers={
+                "Content-Type": "application/x-www-form-urlencoded",
+            },
+            data=urlencode(
+                {"grant_type": "refresh_token", "refresh_token": refresh_token}
+            ),
         )
 
-    async def contracts(self, token) -> any:
+    async def contracts(self, token, allow_stale: bool = True) -> any:
         """
         get an overview of contracts for this client.
 
@@ -87,10 +262,11 @@ class MyLuminusApiClient:
         return await self._api_wrapper(
             method="GET",
             headers={"Authorization": "Bearer " + token},
-            url="https://mobileapi.luminus.be/api/v11/GetContracts",
+            url=self._base_url + "/api/v11/GetContracts",
+            allow_stale=allow_stale,
         )
 
-    async def meters(self, token) -> any:
+    async def meters(self, token, allow_stale: bool = True) -> any:
         """
         gets a list of available meters
 
@@ -107,7 +283,8 @@ class MyLuminusApiClient:
         return await self._api_wrapper(
             method="GET",
             headers={"Authorization": "Bearer " + token},
-            url="https://mobileapi.luminus.be/api/v11/GetMetersConsumptionSources",
+            url=self._base_url + "/api/v11/GetMetersConsumptionSources",
+            allow_stale=allow_stale,
         )
 
     async def budget(self, token) -> any:
@@ -151,7 +328,7 @@ class MyLuminusApiClient:
         return await self._api_wrapper(
             method="GET",
             headers={"Authorization": "Bearer " + token},
-            url="https://mobileapi.luminus.be/api/v11/GetBudgetBillLines",
+            url=self._base_url + "/api/v11/GetBudgetBillLines",
         )
 
     async def accountStatements(self, token, language: str = "nl") -> any:
@@ -172,18 +349,120 @@ class MyLuminusApiClient:
         return await self._api_wrapper(
             method="GET",
             headers={"Authorization": "Bearer " + token, "Accept-Language": language},
-            url="https://mobileapi.luminus.be/api/v11/GetAccountStatement",
+            url=self._base_url + "/api/v11/GetAccountStatement",
         )
 
-    # TODO create service(?) to push inserting meter readings (from P1, manual...)
-    # POST https://mobileapi.luminus.be/api/v11/InsertMeterReading
+    async def alerts(self, token) -> any:
+        """
+        GET https://mobileapi.luminus.be/api/v11/GetAlerts
+
+        {
+            "Alerts": [...]
+        }
+        """
+        return await self._api_wrapper(
+            method="GET",
+            headers={"Authorization": "Bearer " + token},
+            url=self._base_url + "/api/v11/GetAlerts",
+        )
+
+    async def consumptions(
+        self,
+        token,
+        ean: str,
+        energy_type: str,
+        date_from: datetime,
+        date_until: datetime,
+        source: str = "LuminusSap",
+        periodicity: str = "Day",
+    ) -> any:
+        """
+        consumption history for a single meter, periodicity is one of
+        Day, Month or Year
+
+        GET https://mobileapi.luminus.be/api/v11/GetConsumptions?ean=****&source=LuminusSap&energyType=Electricity&dateFrom=2023-07-01T00:00:00&dateUntil=2023-12-31T23:59:59&periodicity=Month
 
-    # one allowed per day, delete again with
-    # POST https://mobileapi.luminus.be/api/v11/DeleteMeterReading
-    # {
-    #    "Ean": "****",
-    #    "Date": "2023-07-20"
-    # }
+        {
+            "Consumptions": [{
+                "From": "2023-07-01T00:00:00",
+                "Until": "2023-07-31T23:59:59",
+                "Value": ***.**
+            }]
+        }
+        """
+        query = urlencode(
+            {
+                "ean": ean,
+                "source": source,
+                "energyType": energy_type,
+                "dateFrom": date_from.strftime("%Y-%m-%dT%H:%M:%S"),
+                "dateUntil": date_until.strftime("%Y-%m-%dT%H:%M:%S"),
+                "periodicity": periodicity,
+            }
+        )
+        return await self._api_wrapper(
+            method="GET",
+            headers={"Authorization": "Bearer " + token},
+            url=self._base_url + "/api/v11/GetConsumptions?" + query,
+        )
+
+    async def metrics_range(
+        self,
+        token,
+        ean: str,
+        source: str = "LuminusSap",
+        allow_stale: bool = True,
+    ) -> any:
+        """
+        range of dates with metering data for a meter
+
+        GET https://mobileapi.luminus.be/api/v11/GetMetricsRange?ean=****&source=LuminusSap
+        """
+        return await self._api_wrapper(
+            method="GET",
+            headers={"Authorization": "Bearer " + token},
+            url=self._base_url
+            + "/api/v11/GetMetricsRange?"
+            + urlencode({"ean": ean, "source": source}),
+            allow_stale=allow_stale,
+        )
+
+    async def insert_meter_reading(self, token, reading: dict) -> any:
+        """
+        push a meter reading (from P1, manual...), one allowed per day
+
+        POST https://mobileapi.luminus.be/api/v11/InsertMeterReading
+
+        {
+            "Ean": "****",
+            "Date": "2023-07-20",
+            ...
+        }
+        """
+        return await self._api_wrapper(
+            method="POST",
+            headers={"Authorization": "Bearer " + token},
+            url=self._base_url + "/api/v11/InsertMeterReading",
+            json=reading,
+        )
+
+    async def delete_meter_reading(self, token, ean: str, date: str) -> any:
+        """
+        delete the reading of a day again, so it can be replaced
+
+        POST https://mobileapi.luminus.be/api/v11/DeleteMeterReading
+
+        {
+            "Ean": "****",
+            "Date": "2023-07-20"
+        }
+        """
+        return await self._api_wrapper(
+            method="POST",
+            headers={"Authorization": "Bearer " + token},
+            url=self._base_url + "/api/v11/DeleteMeterReading",
+            json={"Ean": ean, "Date": date},
+        )
 
     # other discovered API urls not yet consumed
 
@@ -191,10 +470,7 @@ class MyLuminusApiClient:
     # https://mobileapi.luminus.be/api/v11/GetBusinessPartner
     # https://mobileapi.luminus.be/api/v11/GetMeters
     # https://mobileapi.luminus.be/api/v11/GetPaymentOptions
-    # https://mobileapi.luminus.be/api/v11/GetAlerts
-    # https://mobileapi.luminus.be/api/v11/GetMetricsRange?ean=****&source=LuminusSap
     # https://mobileapi.luminus.be/api/v11/GetDynamicContent
-    # https://mobileapi.luminus.be/api/v11/GetConsumptions?ean=****&source=LuminusSap&energyType=Electricity&dateFrom=2023-07-01T00:00:00&dateUntil=2023-12-31T23:59:59&periodicity=Month
     # https://mobileapi.luminus.be/api/v11/GetServicesOverview
     # https://mobileapi.luminus.be/api/v11/GetDynamicMenu
     # https://mobileapi.luminus.be/api/v11/GetUrlList
@@ -206,34 +482,287 @@ class MyLuminusApiClient:
         headers: dict | None = None,
         data: dict | None = None,
         json: dict | None = None,
+        idempotent: bool | None = None,
+        allow_stale: bool = True,
+    ) -> any:
+        """Call the API, identical GETs share one request and its result.
+
+        GETs of endpoints with a cache policy are answered from the cache,
+        expired entries too while they're refreshed in the background unless
+        allow_stale is off, then they're refreshed first. Listeners hear of
+        refreshed responses that changed, see async_listen_revalidated.
+        Results are shared between callers, don't modify them.
+        """
+        if idempotent is None:
+            idempotent = method == "GET"
+        if method != "GET":
+            return await self._api_call(method, url, headers, data, json, idempotent)
+
+        endpoint = endpoint_name(url)
+        if self.cache is None or self.cache.policy(endpoint) is None:
+            return await self._api_get(url, headers)
+        # the client is per login, the token renews so it's not part of the key
+        cache_key = (url, (headers or {}).get("Accept-Language"))
+        cached = await self.cache.async_get(endpoint, cache_key)
+        if cached is not None and not cached[1] and not allow_stale:
+            cached = None
+        if cached is None:
+            result = await self._api_get(url, headers)
+            if result is not None:
+                self.cache.put(endpoint, cache_key, result)
+            return result
+        result, fresh = cached
+        self.metrics.endpoint(endpoint).cache_hits += 1
+        if not fresh and cache_key not in self._revalidating:
+            task = asyncio.ensure_future(
+                self._async_revalidate(endpoint, cache_key, url, headers, result)
+            )
+            self._revalidating[cache_key] = task
+            task.add_done_callback(
+                lambda _task: self._revalidating.pop(cache_key, None)
+            )
+        return result
+
+    async def _async_revalidate(
+        self,
+        endpoint: str,
+        cache_key: tuple,
+        url: str,
+        headers: dict | None,
+        stale: any,
+    ) -> None:
+        """Refresh an expired cache entry, the stale one stays on failure."""
+        try:
+            # the caller has its answer, don't hold this to its budget
+            with deadline(None):
+                result = await self._api_get(url, headers)
+        except MyLuminusApiClientError as exception:
+            LOGGER.debug("refreshing cached %s failed: %s", endpoint, exception)
+            return
+        if result is None:
+            return
+        self.cache.put(endpoint, cache_key, result)
+        if result != stale:
+            for listener in list(self._revalidated_listeners):
+                listener(endpoint)
+
+    async def _api_get(self, url: str, headers: dict | None) -> any:
+        """GET, sharing a request in flight and recent results."""
+        # the token and language are part of the headers, so part of the key
+        key = (url, tuple(sorted((headers or {}).items())))
+        cached = self._results.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            self.metrics.endpoint(endpoint_name(url)).cache_hits += 1
+            return cached[1]
+        flight = self._in_flight.get(key)
+        if flight is None:
+            flight = self._in_flight[key] = asyncio.ensure_future(
+                self._api_call("GET", url, headers, None, None, True)
+            )
+            flight.add_done_callback(partial(self._landed, key))
+        else:
+            self.metrics.endpoint(endpoint_name(url)).coalesced += 1
+        # shield so a cancelled caller doesn't abort the request for the others
+        return await asyncio.shield(flight)
+
+    def _landed(self, key: tuple, flight: asyncio.Future) -> None:
+        """Keep the result of a finished GET around for a moment."""
+        self._in_flight.pop(key, None)
+        # retrieving the exception also keeps asyncio from logging it
+        if flight.cancelled() or flight.exception() is not None:
+            return
+        now = time.monotonic()
+        expired = [
+            item for item, (expires, _) in self._results.items() if expires <= now
+        ]
+        for item in expired:
+            del self._results[item]
+        if self.result_ttl > 0:
+            self._results[key] = (now + self.result_ttl, flight.result())
+
+    async def _api_call(
+        self,
+        method: str,
+        url: str,
+        headers: dict | None,
+        data: dict | None,
+        json: dict | None,
+        idempotent: bool,
+    ) -> any:
+        """Call the API, retrying idempotent calls on communication errors."""
+        attempt = 0
+        while True:
+            if remaining_budget() == 0:
+                raise MyLuminusApiClientDeadlineError("Out of time for this refresh")
+            if not self.circuit.allow():
+                raise MyLuminusApiClientUnavailableError(
+                    "API is failing, holding back calls",
+                )
+            try:
+                if idempotent and method == "GET":
+                    result = await self._api_hedged(url, headers)
+                else:
+                    result = await self._api_request(method, url, headers, data, json)
+            except MyLuminusApiClientDeadlineError:
+                # our budget ran out, that says nothing about the backend
+                raise
+            except MyLuminusApiClientCommunicationError as exception:
+                self.circuit.record_failure()
+                delay = (
+                    self.retry_policy.delay(attempt, exception.retry_after)
+                    if idempotent
+                    else None
+                )
+                remaining = remaining_budget()
+                if delay is None or (remaining is not None and delay >= remaining):
+                    raise
+                LOGGER.debug("retrying %s in %.1fs: %s", url, delay, exception)
+                await asyncio.sleep(delay)
+                attempt += 1
+            except MyLuminusApiClientError:
+                # the backend answered, just not what we hoped for
+                self.circuit.record_success()
+                raise
+            else:
+                self.circuit.record_success()
+                return result
+
+    def _request_timeout(self, endpoint: str) -> tuple[float, bool]:
+        """Timeout of a request, and whether the budget of the refresh set it."""
+        timeout = ENDPOINT_TIMEOUT_SECONDS.get(endpoint, REQUEST_TIMEOUT_SECONDS)
+        remaining = remaining_budget()
+        if remaining is not None and remaining < timeout:
+            return remaining, True
+        return timeout, False
+
+    def _hedge_delay(self, endpoint: str) -> float | None:
+        """Seconds after which a GET is sent again, None to not hedge it."""
+        if self.hedge_percentile is None:
+            return None
+        metrics = self.metrics.endpoint(endpoint)
+        if len(metrics.recent_latencies) < HEDGE_MIN_REQUESTS:
+            return None
+        delay = metrics.recent_percentile(self.hedge_percentile)
+        # a second request that can't finish in time is only extra load
+        if delay is None or delay >= self._request_timeout(endpoint)[0]:
+            return None
+        return delay
+
+    async def _api_hedged(self, url: str, headers: dict | None) -> any:
+        """GET, sending a second request when the first one is slow.
+
+        The first successful answer wins and the other request is cancelled,
+        when both fail the last error is raised.
+        """
+        endpoint = endpoint_name(url)
+        hedge_after = self._hedge_delay(endpoint)
+        if hedge_after is None:
+            return await self._api_request("GET", url, headers)
+
+        request = partial(self._api_request, "GET", url, headers)
+        first = asyncio.ensure_future(request())
+        pending = {first}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=hedge_after)
+            if not done:
+                self.metrics.endpoint(endpoint).hedged += 1
+                pending.add(asyncio.ensure_future(request()))
+            while True:
+                for attempt in done:
+                    if attempt.exception() is None:
+                        if attempt is not first:
+                            self.metrics.endpoint(endpoint).hedge_wins += 1
+                        return attempt.result()
+                    failed = attempt
+                if not pending:
+                    return failed.result()
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+        finally:
+            for attempt in pending:
+                attempt.cancel()
+
+    async def _api_request(
+        self,
+        method: str,
+        url: str,
+        headers: dict | None = None,
+        data: dict | None = None,
+        json: dict | None = None,
     ) -> any:
         """Get information from the API."""
+        if self._limiter is not None:
+            await self._limiter.acquire(self._username)
+        endpoint = endpoint_name(url)
+        metrics = self.metrics.endpoint(endpoint)
+        timeout, budgeted = self._request_timeout(endpoint)
+        start = time.monotonic()
+        finished = True
+        succeeded = False
         try:
-            async with async_timeout.timeout(10):
-                response = await self._session.request(
+            async with async_timeout.timeout(timeout):
+                response = await self.transport.async_request(
                     method=method,
                     url=url,
                     headers=headers,
                     data=data,
                     json=json,
                 )
+                metrics.record_status(response.status)
                 if response.status in (401, 403, 601):
+                    metrics.auth_failures += 1
                     raise MyLuminusApiClientAuthenticationError(
                         "Invalid credentials",
                     )
-                response.raise_for_status()
-                return await response.json()
-
+                if response.status == 429 or response.status >= 500:
+                    raise MyLuminusApiClientCommunicationError(
+                        f"Server error {response.status}",
+                        retry_after=parse_retry_after(
+                            response.headers.get("Retry-After")
+                        ),
+                    )
+                if response.status >= 400:
+                    # retrying won't change the answer
+                    raise MyLuminusApiClientError(
+                        f"Request refused with status {response.status}",
+                    )
+                # posting readings doesn't always come with a body
+                metrics.response_bytes += len(response.body)
+                result = decode_response(endpoint, response.body)
+                succeeded = True
+                return result
+
+        except MyLuminusResponseTooLargeError as exception:
+            metrics.errors += 1
+            raise MyLuminusApiClientError("Response too large") from exception
+        except MyLuminusApiClientError:
+            metrics.errors += 1
+            raise
         except asyncio.TimeoutError as exception:
+            metrics.timeouts += 1
+            if budgeted:
+                raise MyLuminusApiClientDeadlineError(
+                    "Out of time for this refresh",
+                ) from exception
             raise MyLuminusApiClientCommunicationError(
                 "Timeout error fetching information",
             ) from exception
         except (aiohttp.ClientError, socket.gaierror) as exception:
+            metrics.errors += 1
             LOGGER.debug("received error is %s", exception)
             raise MyLuminusApiClientCommunicationError(
                 "Error fetching information",
             ) from exception
         except Exception as exception:  # pylint: disable=broad-except
+            metrics.errors += 1
             raise MyLuminusApiClientError(
                 "Something really wrong happened!"
             ) from exception
+        except asyncio.CancelledError:
+            # a hedge that lost, its latency would drag the percentiles down
+            finished = False
+            raise
+        finally:
+            if finished:
+                metrics.record_latency(time.monotonic() - start, succeeded)
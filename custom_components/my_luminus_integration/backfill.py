@@ -0,0 +1,205 @@
+"""Background backfill of consumption history for new accounts."""
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timedelta
+
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+from .api import MyLuminusApiClientError
+from .const import (
+    BACKFILL_CONCURRENCY,
+    BACKFILL_DAYS,
+    BACKFILL_PAUSE,
+    BACKFILL_WINDOW,
+    CONSUMPTION_PERIODICITY,
+    LOGGER,
+)
+from .consumption_store import parse_periods
+from .coordinator import MyLuminusCoordinator, MyLuminusMeterCoordinator
+from .resilience import deadline
+
+
+def _next_window(start: datetime, window: str) -> datetime:
+    """Start of the window following the one starting at start."""
+    if window == "Day":
+        return start + timedelta(days=1)
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+def window_start(moment: datetime, window: str) -> datetime:
+    """Start of the Month or Day window holding moment."""
+    start = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if window != "Day":
+        start = start.replace(day=1)
+    return start
+
+
+def windows(date_from: datetime, date_until: datetime, window: str) -> list[datetime]:
+    """Starts of the Month or Day windows between both dates."""
+    start = window_start(date_from, window)
+    starts = []
+    while start < date_until:
+        starts.append(start)
+        start = _next_window(start, window)
+    return starts
+
+
+class MyLuminusBackfill:
+    """Fetches years of consumption history in windows, resumable.
+
+    Every meter gets its own backfill once Home Assistant is up, meters added
+    later as soon as their coordinator is. Windows are fetched a few at a time
+    over all meters and checkpointed in the consumption store, so an
+    interrupted backfill continues where it stopped. Each window waits for a
+    running coordinator refresh and pauses afterwards, the regular refresh
+    always goes first.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        coordinator: MyLuminusCoordinator,
+        days: int = BACKFILL_DAYS,
+        window: str = BACKFILL_WINDOW,
+        concurrency: int = BACKFILL_CONCURRENCY,
+    ) -> None:
+        self._hass = hass
+        self._coordinator = coordinator
+        self._store = coordinator.consumption_store
+        self._days = days
+        self._window = window
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._started = False
+        self._tasks: dict[str, asyncio.Task] = {}  # EAN to its backfill
+
+    def async_start(self) -> None:
+        """Backfill the meters known so far and those added from now on."""
+        self._started = True
+        for meter in self._coordinator.meter_coordinators.values():
+            self.async_add_meter(meter)
+
+    def async_add_meter(self, meter: MyLuminusMeterCoordinator) -> None:
+        """Backfill a meter in the background, once started."""
+        if not self._started:
+            return
+        task = self._tasks.get(meter.ean)
+        if task is None or task.done():
+            self._tasks[meter.ean] = self._hass.async_create_task(
+                self.async_run(meter)
+            )
+
+    def async_remove_meter(self, ean: str) -> None:
+        """Stop the backfill of a removed meter."""
+        task = self._tasks.pop(ean, None)
+        if task is not None and not task.done():
+            task.cancel()
+
+    def async_cancel(self) -> None:
+        """Stop the backfill, completed windows are kept."""
+        self._started = False
+        for ean in list(self._tasks):
+            self.async_remove_meter(ean)
+
+    async def async_run(self, meter: MyLuminusMeterCoordinator) -> None:
+        """Fetch all windows of a meter not completed before."""
+        # meters added by a refresh start here within its budget, don't keep it
+        with deadline(None):
+            await self._async_run(meter)
+
+    async def _async_run(self, meter: MyLuminusMeterCoordinator) -> None:
+        # the regular sync covers the current window
+        date_until = window_start(dt_util.now().replace(tzinfo=None), self._window)
+        date_from = date_until - timedelta(days=self._days)
+
+        completed = await self._hass.async_add_executor_job(
+            self._store.completed_windows,
+            meter.ean,
+            meter.energy_type,
+            CONSUMPTION_PERIODICITY,
+        )
+        starts = [
+            start
+            for start in windows(date_from, date_until, self._window)
+            if start not in completed
+        ]
+        if not starts:
+            return
+
+        LOGGER.debug("backfilling %s consumption windows of %s", len(starts), meter.ean)
+        # a window that blew up doesn't stop the others from being checkpointed
+        results = await asyncio.gather(
+            *(self._async_fetch_window(meter, start) for start in starts),
+            return_exceptions=True,
+        )
+        for start, result in zip(starts, results):
+            if isinstance(result, BaseException):
+                LOGGER.warning(
+                    "backfill of %s from %s failed: %s", meter.ean, start, result
+                )
+        LOGGER.debug(
+            "backfill of %s done, %s of %s windows fetched",
+            meter.ean,
+            sum(result is True for result in results),
+            len(starts),
+        )
+        # older history changes the price calibration
+        self._coordinator.async_update_projections({meter.ean})
+        # and the running sums, statistics are imported again all at once
+        series = await self._coordinator.async_get_series(meter.ean, meter.energy_type)
+        if series is not None:
+            await self._coordinator.async_import_statistics(
+                series, meter.ean, meter.energy_type
+            )
+
+    async def _async_fetch_window(
+        self, meter: MyLuminusMeterCoordinator, start: datetime
+    ) -> bool:
+        """Fetch and checkpoint one window, False when it failed."""
+        async with self._semaphore:
+            # let a regular refresh finish first
+            await self._coordinator.idle.wait()
+            try:
+                token = await self._coordinator.client.async_get_access_token()
+                response = await self._coordinator.client.consumptions(
+                    token=token,
+                    ean=meter.ean,
+                    energy_type=meter.energy_type,
+                    date_from=start,
+                    date_until=_next_window(start, self._window)
+                    - timedelta(seconds=1),
+                    source=meter.source,
+                    periodicity=CONSUMPTION_PERIODICITY,
+                )
+            except MyLuminusApiClientError as exception:
+                LOGGER.debug(
+                    "backfill of %s from %s failed: %s", meter.ean, start, exception
+                )
+                return False
+            if not response:
+                # nothing to checkpoint, the window is tried again next start
+                LOGGER.debug(
+                    "backfill of %s from %s got an empty response", meter.ean, start
+                )
+                return False
+            periods = response.get("Consumptions", [])
+            series = await self._coordinator.async_get_series(
+                meter.ean, meter.energy_type
+            )
+            if series is not None:
+                await self._hass.async_add_executor_job(
+                    series.extend, parse_periods(periods)
+                )
+            await self._hass.async_add_executor_job(
+                self._store.add_window,
+                meter.ean,
+                meter.energy_type,
+                CONSUMPTION_PERIODICITY,
+                start,
+                periods,
+            )
+            await asyncio.sleep(BACKFILL_PAUSE)
+        return True
@@ -0,0 +1,108 @@
+"""Response cache of the API client, per endpoint TTL and size."""
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from homeassistant.helpers.storage import Store
+
+# seconds to wait before writing the persisted entries to disk
+CACHE_SAVE_DELAY = 60
+
+
+@dataclass(frozen=True, slots=True)
+class CachePolicy:
+    """How long and how many responses of an endpoint are kept."""
+
+    ttl: float
+    max_entries: int = 8
+    persist: bool = False
+
+
+# endpoints that next to never change, anything else isn't cached. TTLs of
+# polled endpoints stay well below their polling interval, so a scheduled
+# fetch finds an expired copy and refreshes it in the background, while
+# restarts and reloads in between are answered without a request
+DEFAULT_POLICIES = {
+    "GetContracts": CachePolicy(ttl=12 * 3600, persist=True),
+    "GetMetersConsumptionSources": CachePolicy(ttl=12 * 3600, persist=True),
+    "GetBusinessPartner": CachePolicy(ttl=7 * 24 * 3600, persist=True),
+    "GetUrlList": CachePolicy(ttl=7 * 24 * 3600, persist=True),
+    # per meter, so room for a few of them
+    "GetMetricsRange": CachePolicy(ttl=3 * 3600, max_entries=64),
+}
+
+
+class MyLuminusResponseCache:
+    """Least recently used responses per endpoint, optionally kept on disk.
+
+    Entries past their TTL are still handed out, flagged as stale, so the
+    client can answer at once and refresh in the background. Stored times
+    are wall clock times so persisted entries age across restarts.
+    """
+
+    def __init__(
+        self,
+        policies: dict[str, CachePolicy] | None = None,
+        store: Store | None = None,
+    ) -> None:
+        self._policies = DEFAULT_POLICIES if policies is None else policies
+        self._store = store
+        self._loaded = store is None
+        self._load_lock = asyncio.Lock()
+        self._entries: dict[str, OrderedDict[tuple, tuple[float, any]]] = {}
+
+    def policy(self, endpoint: str) -> CachePolicy | None:
+        """Return the policy of an endpoint, None when it isn't cached."""
+        return self._policies.get(endpoint)
+
+    async def async_get(self, endpoint: str, key: tuple) -> tuple[any, bool] | None:
+        """Return (response, fresh) or None when nothing is cached."""
+        await self._async_ensure_loaded()
+        entries = self._entries.get(endpoint)
+        if not entries or key not in entries:
+            return None
+        entries.move_to_end(key)
+        stored_at, value = entries[key]
+        return value, time.time() - stored_at < self._policies[endpoint].ttl
+
+    def put(self, endpoint: str, key: tuple, value: any) -> None:
+        """Keep a response, evicting the least recently used ones over the limit."""
+        policy = self._policies[endpoint]
+        entries = self._entries.setdefault(endpoint, OrderedDict())
+        entries[key] = (time.time(), value)
+        entries.move_to_end(key)
+        while len(entries) > policy.max_entries:
+            entries.popitem(last=False)
+        if policy.persist and self._store is not None:
+            self._store.async_delay_save(self._data_to_save, CACHE_SAVE_DELAY)
+
+    async def _async_ensure_loaded(self) -> None:
+        """Load the persisted entries on first use."""
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if self._loaded:
+                return
+            stored = await self._store.async_load() or {}
+            for endpoint, items in stored.items():
+                if endpoint not in self._policies:
+                    continue
+                entries = self._entries.setdefault(endpoint, OrderedDict())
+                for key, stored_at, value in items:
+                    entries.setdefault(tuple(key), (stored_at, value))
+            self._loaded = True
+
+    def _data_to_save(self) -> dict:
+        return {
+            endpoint: [
+                [list(key), stored_at, value]
+                for key, (stored_at, value) in entries.items()
+            ]
+            for endpoint, entries in self._entries.items()
+            if self._policies[endpoint].persist
+        }
@@ -1,4 +1,5 @@
 """Constants for Integration."""
+from datetime import timedelta
 from logging import Logger, getLogger
 
 LOGGER: Logger = getLogger(__package__)
@@ -7,3 +8,59 @@ NAME = "My Luminus Integration"
 DOMAIN = "my_luminus_integration"
 VERSION = "0.1.0"
 ATTRIBUTION = "Data provided by https://mobileapi.luminus.be/api"
+API_BASE_URL = "https://mobileapi.luminus.be"
+
+# responses over this size are refused
+MAX_RESPONSE_BYTES = 8 * 1024 * 1024
+
+# upper bound on API calls running at the same time during one refresh
+DEFAULT_MAX_CONCURRENT_REQUESTS = 4
+
+# identical GETs in flight share one request, its result serves bursts this long
+COALESCE_RESULT_SECONDS = 5
+
+# time budgets in seconds, a refresh cycle shares one between its requests and
+# a single request never takes longer than its endpoint timeout
+CYCLE_DEADLINE_SECONDS = 45
+METER_CYCLE_DEADLINE_SECONDS = 90
+REQUEST_TIMEOUT_SECONDS = 10
+ENDPOINT_TIMEOUT_SECONDS = {"GetConsumptions": 30}
+# idempotent GETs still unanswered at this latency percentile of the endpoint
+# are sent a second time, once enough recent successful requests were seen
+HEDGE_PERCENTILE = 95
+HEDGE_MIN_REQUESTS = 20
+
+# consumption history is synced per day, a new meter starts with this much history
+CONSUMPTION_PERIODICITY = "Day"
+INITIAL_CONSUMPTION_DAYS = 31
+# per meter data like consumptions, new periods show up once a day at most
+METER_UPDATE_INTERVAL = timedelta(hours=6)
+
+# readings pushed with the publish_meter_values service
+SERVICE_PUBLISH_METER_VALUES = "publish_meter_values"
+# coordinator cycles run under the profiler by this service, see profiling.py
+SERVICE_PROFILE_CYCLE = "profile_cycle"
+OUTBOX_BATCH_SIZE = 10
+OUTBOX_MAX_ATTEMPTS = 8
+
+# clients are shared between config entries, see registry.py
+DATA_CLIENTS = "clients"
+CONNECTION_POOL_SIZE = 10
+RATE_LIMIT_PER_SECOND = 5
+RATE_LIMIT_BURST = 10
+
+# history fetched in the background for new accounts, see backfill.py
+BACKFILL_DAYS = 3 * 365
+BACKFILL_WINDOW = "Month"
+BACKFILL_CONCURRENCY = 2
+BACKFILL_PAUSE = 1.0
+
+# projected cost, see projection.py. Consumption over this many recent days
+# sets the pace, shorter for variable prices where recent usage weighs more
+PROJECTION_WINDOW_DAYS = {"Fixed": 365, "Variable": 30}
+PROJECTION_DEFAULT_WINDOW_DAYS = 90
+# too little data in a window gives no rate
+PROJECTION_MIN_COVERAGE_DAYS = 7
+
+# consumption imported as long term statistics, see statistics.py
+STATISTICS_BATCH_SIZE = 5000
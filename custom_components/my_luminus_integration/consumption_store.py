@@ -0,0 +1,184 @@
+"""Local store for consumption history fetched from GetConsumptions."""
+from __future__ import annotations
+
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+# API timestamps are local wall clock time without offset, we keep them as
+# seconds since epoch of that wall clock time so they stay sortable integers
+_EPOCH = datetime(1970, 1, 1)
+
+
+def to_epoch(value: str) -> int:
+    """Convert an API timestamp like 2023-07-01T00:00:00 to stored seconds."""
+    wall_clock = datetime.fromisoformat(value).replace(tzinfo=None)
+    return int((wall_clock - _EPOCH).total_seconds())
+
+
+def from_epoch(value: int) -> datetime:
+    """Convert stored seconds back to a naive wall clock datetime."""
+    return datetime.fromtimestamp(value, tz=timezone.utc).replace(tzinfo=None)
+
+
+def parse_periods(periods: list[dict]) -> list[tuple[int, int, float]]:
+    """Convert GetConsumptions periods to (start, end, value) rows."""
+    return [
+        (to_epoch(period["From"]), to_epoch(period["Until"]), float(period["Value"]))
+        for period in periods
+        if period.get("Value") is not None
+    ]
+
+
+class MyLuminusConsumptionStore:
+    """SQLite backed consumption history, keyed by EAN, energy type and period.
+
+    All methods do blocking IO, run them in the executor.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._lock = threading.Lock()
+        self._connection: sqlite3.Connection | None = None
+
+    def open(self) -> None:
+        """Open the database and create the tables when needed."""
+        self._connection = sqlite3.connect(self._path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.executescript(
+                """
+                PRAGMA journal_mode=WAL;
+                CREATE TABLE IF NOT EXISTS consumption (
+                    ean TEXT NOT NULL,
+                    energy_type TEXT NOT NULL,
+                    periodicity TEXT NOT NULL,
+                    start INTEGER NOT NULL,
+                    end INTEGER NOT NULL,
+                    value REAL NOT NULL,
+                    PRIMARY KEY (ean, energy_type, periodicity, start)
+                ) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS backfill_window (
+                    ean TEXT NOT NULL,
+                    energy_type TEXT NOT NULL,
+                    periodicity TEXT NOT NULL,
+                    start INTEGER NOT NULL,
+                    PRIMARY KEY (ean, energy_type, periodicity, start)
+                ) WITHOUT ROWID;
+                """
+            )
+
+    def close(self) -> None:
+        """Close the database."""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def last_period_start(
+        self, ean: str, energy_type: str, periodicity: str
+    ) -> datetime | None:
+        """Return the start of the most recent stored period, the sync checkpoint."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT MAX(start) FROM consumption"
+                " WHERE ean = ? AND energy_type = ? AND periodicity = ?",
+                (ean, energy_type, periodicity),
+            ).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return from_epoch(row[0])
+
+    def last_period(
+        self, ean: str, energy_type: str, periodicity: str
+    ) -> tuple[int, int, float] | None:
+        """Return (start, end, value) of the most recent stored period."""
+        with self._lock:
+            return self._connection.execute(
+                "SELECT start, end, value FROM consumption"
+                " WHERE ean = ? AND energy_type = ? AND periodicity = ?"
+                " ORDER BY start DESC LIMIT 1",
+                (ean, energy_type, periodicity),
+            ).fetchone()
+
+    def add_periods(
+        self, ean: str, energy_type: str, periodicity: str, periods: list[dict]
+    ) -> int:
+        """Insert or update consumption periods from an API response."""
+        rows = [
+            (ean, energy_type, periodicity, *period)
+            for period in parse_periods(periods)
+        ]
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO consumption VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def all_periods(
+        self, ean: str, energy_type: str, periodicity: str
+    ) -> list[tuple[int, int, float]]:
+        """Return all stored (start, end, value) rows, oldest first."""
+        with self._lock:
+            return self._connection.execute(
+                "SELECT start, end, value FROM consumption"
+                " WHERE ean = ? AND energy_type = ? AND periodicity = ?"
+                " ORDER BY start",
+                (ean, energy_type, periodicity),
+            ).fetchall()
+
+    def completed_windows(
+        self, ean: str, energy_type: str, periodicity: str
+    ) -> set[datetime]:
+        """Starts of the backfill windows fetched before."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT start FROM backfill_window"
+                " WHERE ean = ? AND energy_type = ? AND periodicity = ?",
+                (ean, energy_type, periodicity),
+            ).fetchall()
+        return {from_epoch(row[0]) for row in rows}
+
+    def add_window(
+        self,
+        ean: str,
+        energy_type: str,
+        periodicity: str,
+        window_start: datetime,
+        periods: list[dict],
+    ) -> int:
+        """Store the periods of a backfill window and mark it as completed."""
+        stored = self.add_periods(ean, energy_type, periodicity, periods)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO backfill_window VALUES (?, ?, ?, ?)",
+                (
+                    ean,
+                    energy_type,
+                    periodicity,
+                    int((window_start - _EPOCH).total_seconds()),
+                ),
+            )
+        return stored
+
+    def periods(
+        self,
+        ean: str,
+        energy_type: str,
+        periodicity: str,
+        date_from: datetime,
+        date_until: datetime,
+    ) -> list[tuple[int, int, float]]:
+        """Return (start, end, value) rows for periods starting in the range."""
+        with self._lock:
+            return self._connection.execute(
+                "SELECT start, end, value FROM consumption"
+                " WHERE ean = ? AND energy_type = ? AND periodicity = ?"
+                " AND start >= ? AND start < ? ORDER BY start",
+                (
+                    ean,
+                    energy_type,
+                    periodicity,
+                    int((date_from - _EPOCH).total_seconds()),
+                    int((date_until - _EPOCH).total_seconds()),
+                ),
+            ).fetchall()
@@ -1,22 +1,77 @@
 """DataUpdateCoordinator for Integration."""
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import json
+from collections.abc import Awaitable, Callable
+from contextlib import AbstractContextManager, nullcontext
 from datetime import timedelta
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.update_coordinator import (
     DataUpdateCoordinator,
     UpdateFailed,
 )
-from homeassistant.exceptions import ConfigEntryAuthFailed
+from homeassistant.exceptions import ConfigEntryAuthFailed, HomeAssistantError
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
 
 from .api import (
     MyLuminusApiClient,
     MyLuminusApiClientAuthenticationError,
     MyLuminusApiClientError,
 )
-from .const import DOMAIN, LOGGER
+from .const import (
+    CONSUMPTION_PERIODICITY,
+    CYCLE_DEADLINE_SECONDS,
+    DEFAULT_MAX_CONCURRENT_REQUESTS,
+    DOMAIN,
+    INITIAL_CONSUMPTION_DAYS,
+    LOGGER,
+    METER_CYCLE_DEADLINE_SECONDS,
+    METER_UPDATE_INTERVAL,
+)
+from .consumption_store import MyLuminusConsumptionStore, parse_periods
+from .models import METERS, MyLuminusSnapshot
+from .profiling import MyLuminusProfiler
+from .projection import PROJECTION_FIELDS, MyLuminusProjectionEngine
+from .resilience import deadline
+from .timeseries import MyLuminusSeriesStore, MyLuminusTimeSeries
+from .scheduler import MyLuminusScheduler
+from .statement_index import INVOICE, PAYMENT, MyLuminusStatementIndex
+
+# seconds to wait before writing the last known data to disk
+CACHE_SAVE_DELAY = 30
+
+# endpoints our entities render, only changes in these need a state write
+DISPATCHED_ENDPOINTS = frozenset({"budget", "statements"})
+
+# handed out for every span when not profiling
+_NO_SPAN = nullcontext()
+# endpoints the cost projections depend on
+PROJECTED_ENDPOINTS = frozenset({"budget", "contracts"})
+# endpoints answered from the response cache, by API endpoint
+CACHED_ENDPOINTS = {
+    "GetContracts": "contracts",
+    "GetMetersConsumptionSources": "meters",
+}
+
+
+def _normalize(name: str, payload: any) -> any:
+    """Reduce a payload to what matters for change detection."""
+    if name == "budget":
+        return sorted(payload.get("Lines", []), key=lambda line: line.get("Ean", ""))
+    if name == "statements":
+        return payload.get("AmountOpen")
+    return payload
+
+
+def fingerprint(payload: any) -> str:
+    """Stable digest of a json payload, independent of key order."""
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(encoded.encode(), digest_size=16).hexdigest()
 
 
 # https://developers.home-assistant.io/docs/integration_fetching_data#coordinated-single-api-poll-for-data-for-all-entities
@@ -27,14 +82,60 @@ class MyLuminusCoordinator(DataUpdateCoordinator):
 
     token = None  # auth token
     lines = []  # fetched budget lines
+    statements = {}  # fetched account statement
+    outbox = None  # meter readings waiting to be submitted
+    backfill = None  # consumption history fetched in the background
+    profiler: MyLuminusProfiler | None = None  # set by the profile_cycle service
+    statistics = None  # imports consumption as long term statistics
 
     def __init__(
         self,
         hass: HomeAssistant,
         client: MyLuminusApiClient,
+        max_concurrent_requests: int = DEFAULT_MAX_CONCURRENT_REQUESTS,
+        consumption_store: MyLuminusConsumptionStore | None = None,
+        cache: Store | None = None,
+        statement_index: MyLuminusStatementIndex | None = None,
+        series_store: MyLuminusSeriesStore | None = None,
     ) -> None:
         """Initialize."""
         self.client = client
+        self.consumption_store = consumption_store
+        # the same consumption as memory mapped arrays, for range reads
+        self.series_store = series_store
+        # per meter endpoints are fetched by their own coordinators
+        self.meter_coordinators: dict[str, MyLuminusMeterCoordinator] = {}
+        # coordinators of removed meters that are still refreshing
+        self._retired: set[MyLuminusMeterCoordinator] = set()
+        # invoice and payment history lives on disk, only the latest in memory
+        self.statement_index = statement_index
+        self.latest_statements: dict[str, dict | None] = {}
+        # last known data, to start without waiting on the backend
+        self._cache = cache
+        self._cached_refresh_token: str | None = None
+        self.scheduler = MyLuminusScheduler()
+        self._semaphore = asyncio.Semaphore(max_concurrent_requests)
+        # cleared while refreshing, background work waits for it
+        self.idle = asyncio.Event()
+        self.idle.set()
+        # set on unload, nothing is fetched anymore
+        self.closing = False
+        self.endpoint_errors: dict[str, str] = {}
+        # change detection, see async_update_listeners
+        self._fingerprints: dict[str, str] = {}
+        self.changed_endpoints: set[str] = set()
+        # parsed once per update, entities read from here
+        self.snapshot = MyLuminusSnapshot()
+        self.changed_fields: set[tuple[str | None, str]] = set()
+        self._dispatch_needed = True
+        # cost projections over the consumption history of the meters
+        self.projections = MyLuminusProjectionEngine()
+        self._last_dispatched_success: bool | None = None
+        self._unsub_revalidated = client.async_listen_revalidated(
+            self._async_revalidated
+        )
+        self.dispatched_updates = 0
+        self.skipped_updates = 0
         super().__init__(
             hass=hass,
             logger=LOGGER,
@@ -42,76 +143,552 @@ class MyLuminusCoordinator(DataUpdateCoordinator):
             update_interval=timedelta(minutes=5),
         )
 
-    async def _async_update_data(self):
-        """Update data via library."""
-        try:
-            # attempt to retrieve unit number
-            # return await self.client.async_get_last_transmit()
-
-            # start by getting a new token for all the next calls
-            response = await self.client.token()
-            LOGGER.debug("received data from token %s", response)
-
-            self.token = response["access_token"]
-
-            # also get last transmit at this point
-            LOGGER.debug("received access token from API %s", self.token)
-
-            # now get some initial data to populate some sensors
-            # we"ll start by implementing budget lines
-            data = await self.client.budget(token=self.token)
-
-            """
-            # test data
-            data = {
-                "Lines": [
-                    {
-                        "Ean": "109823898932",
-                        "NextInvoiceDate": "2023-08-14",
-                        "Frequency": "Monthly",
-                        "CurrentAmount": 116.0,
-                        "IdealAmount": 192.0,
-                        "MinimumAmount": 117.0,
-                        "MaximumAmount": 1876.0,
-                        "CurrentSettlementAmount": 1755.0,
-                        "SubTotal": 1915.19,
-                        "OpenSlices": 10,
-                    },
-                    {
-                        "Ean": "2390823890",
-                        "NextInvoiceDate": "2023-08-14",
-                        "Frequency": "Monthly",
-                        "CurrentAmount": 216.0,
-                        "IdealAmount": 292.0,
-                        "MinimumAmount": 217.0,
-                        "MaximumAmount": 2876.0,
-                        "CurrentSettlementAmount": 2755.0,
-                        "SubTotal": 2915.19,
-                        "OpenSlices": 10,
-                    },
-                ]
-            }
-            """
-
-            self.lines = data["Lines"]
-
-            # also get open amount
-            # we need a language for that but only nl and fr are supported !?
-            languageCode = self.get_valid_language(hass=self.hass)
-            self.statements = await self.client.accountStatements(
-                token=self.token, language=languageCode
-            )
+    @property
+    def eans(self) -> set[str]:
+        """EANs known for this account."""
+        meters = (self.data or {}).get("meters", {}).get("Meters", [])
+        return {line["Ean"] for line in self.lines} | {
+            meter["Ean"] for meter in meters
+        }
+
+    def _endpoints(self) -> dict[str, Callable[[], Awaitable]]:
+        """Independent endpoints fetched on a refresh, by name."""
+        # we need a language for statements but only nl and fr are supported !?
+        language_code = self.get_valid_language(hass=self.hass)
+        return {
+            "budget": lambda: self.client.budget(token=self.token),
+            "statements": lambda: self.client.accountStatements(
+                token=self.token, language=language_code
+            ),
+            # expired cached copies are used while they're refreshed, see
+            # _async_revalidated
+            "contracts": lambda: self.client.contracts(token=self.token),
+            "meters": lambda: self.client.meters(token=self.token),
+            "alerts": lambda: self.client.alerts(token=self.token),
+        }
+
+    def _span(self, name: str) -> AbstractContextManager:
+        """Time a phase of the cycle while profiling."""
+        if self.profiler is None:
+            return _NO_SPAN
+        return self.profiler.span(name)
 
-            return data
+    async def _async_fetch(self, name: str, fetch: Callable[[], Awaitable]) -> any:
+        """Run a single endpoint call within the concurrency limit."""
+        async with self._semaphore:
+            with self._span(name):
+                return await fetch()
 
+    async def _async_login(self, due: set[str], now) -> None:
+        """Get an access token for the endpoints that are due."""
+        try:
+            with self._span("token"):
+                self.token = await self.client.async_get_access_token()
         except MyLuminusApiClientAuthenticationError as exception:
             raise ConfigEntryAuthFailed(exception) from exception
         except MyLuminusApiClientError as exception:
+            for name in due:
+                self.scheduler.record_failure(name, now)
             raise UpdateFailed(exception) from exception
 
+    async def _async_fetch_all(
+        self, endpoints: dict[str, Callable[[], Awaitable]]
+    ) -> list:
+        """Fetch endpoints side by side, failures are returned as exceptions."""
+        return await asyncio.gather(
+            *(self._async_fetch(name, fetch) for name, fetch in endpoints.items()),
+            return_exceptions=True,
+        )
+
+    async def _async_update_data(self):
+        """Update data via library."""
+        if self.closing:
+            return self.data
+        now = dt_util.utcnow()
+        self.idle.clear()
+        try:
+            # one slow response shouldn't hold up the whole cycle
+            with deadline(CYCLE_DEADLINE_SECONDS), self._span("cycle"):
+                return await self._async_update_due(now)
+        finally:
+            self.idle.set()
+            # wake up again when the first endpoint is due, but not before the
+            # API is probed again when it has been failing
+            self.update_interval = max(
+                self.scheduler.next_wakeup(dt_util.utcnow()),
+                timedelta(seconds=self.client.circuit.seconds_until_probe()),
+            )
+
+    async def _async_update_due(self, now):
+        """Fetch the endpoints that are due according to the scheduler."""
+        due = self.scheduler.due(now)
+        self.changed_endpoints = set()
+        self.changed_fields = set()
+        endpoints = {
+            name: fetch for name, fetch in self._endpoints().items() if name in due
+        }
+        if not endpoints:
+            self._dispatch_needed = False
+            return self.data
+
+        # reuse the token until it's about to expire, no login every poll
+        await self._async_login(due, now)
+
+        # all endpoints only depend on the token, fetch them side by side
+        results = dict(zip(endpoints, await self._async_fetch_all(endpoints)))
+        refused = [
+            name
+            for name, result in results.items()
+            if isinstance(result, MyLuminusApiClientAuthenticationError)
+        ]
+        if refused:
+            # the token might have been revoked early, log in again and retry
+            # once, only a refused login means the credentials are wrong
+            self.client.tokens.invalidate(self.token)
+            await self._async_login(due, now)
+            retried = {name: endpoints[name] for name in refused}
+            results.update(zip(retried, await self._async_fetch_all(retried)))
+
+        # keep what we had for endpoints that failed or weren't due
+        data = dict(self.data or {})
+        errors = {}
+        for name, result in results.items():
+            if isinstance(result, MyLuminusApiClientError):
+                LOGGER.warning("failed to fetch %s: %s", name, result)
+                errors[name] = result
+                self.scheduler.record_failure(name, now)
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                data[name] = result
+                self._track_change(name, result)
+
+        for name in endpoints:
+            self.endpoint_errors.pop(name, None)
+        self.endpoint_errors.update(
+            {name: str(error) for name, error in errors.items()}
+        )
+        if errors and len(errors) == len(endpoints):
+            raise UpdateFailed(next(iter(errors.values())))
+
+        """
+        # test data
+        data["budget"] = {
+            "Lines": [
+                {
+                    "Ean": "109823898932",
+                    "NextInvoiceDate": "2023-08-14",
+                    "Frequency": "Monthly",
+                    "CurrentAmount": 116.0,
+                    "IdealAmount": 192.0,
+                    "MinimumAmount": 117.0,
+                    "MaximumAmount": 1876.0,
+                    "CurrentSettlementAmount": 1755.0,
+                    "SubTotal": 1915.19,
+                    "OpenSlices": 10,
+                },
+                {
+                    "Ean": "2390823890",
+                    "NextInvoiceDate": "2023-08-14",
+                    "Frequency": "Monthly",
+                    "CurrentAmount": 216.0,
+                    "IdealAmount": 292.0,
+                    "MinimumAmount": 217.0,
+                    "MaximumAmount": 2876.0,
+                    "CurrentSettlementAmount": 2755.0,
+                    "SubTotal": 2915.19,
+                    "OpenSlices": 10,
+                },
+            ]
+        }
+        """
+
+        statement_changes = set()
+        if (
+            "statements" in endpoints
+            and "statements" not in errors
+            and self.statement_index is not None
+        ):
+            with self._span("index_statements"):
+                statement_changes = await self._async_index_statements(data)
+
+        with self._span("process"):
+            self._process(data)
+        if statement_changes:
+            self.changed_fields |= statement_changes
+            self._dispatch_needed = True
+        if self.changed_endpoints or self._cached_refresh_token != (
+            self.client.tokens.refresh_token
+        ):
+            self._async_save_cache(data)
+
+        # plan the next fetch, budget lines tell us when invoices are near
+        self.scheduler.set_invoice_dates(self.lines)
+        for name in endpoints:
+            if name not in errors:
+                self.scheduler.record(name, now, name in self.changed_endpoints)
+
+        # every meter gets its own coordinator for per meter endpoints
+        if "meters" in self.changed_endpoints:
+            self._async_update_meter_coordinators(data["meters"])
+
+        return data
+
+    def _process(self, data: dict) -> None:
+        """Derive what the entities show from the endpoint data."""
+        self.lines = data.get("budget", {}).get("Lines", [])
+        self.statements = data.get("statements", {})
+        if self.changed_endpoints & DISPATCHED_ENDPOINTS:
+            snapshot = MyLuminusSnapshot.from_api(
+                data.get("budget", {}), self.statements
+            )
+            self.changed_fields = snapshot.changes(self.snapshot)
+            self.snapshot = snapshot
+        if self.changed_endpoints & PROJECTED_ENDPOINTS:
+            self.projections.set_inputs(
+                data.get("budget", {}), data.get("contracts", {})
+            )
+            self.changed_fields |= self._recompute_projections()
+        self._dispatch_needed = bool(self.changed_fields)
+
+    def _recompute_projections(
+        self, eans: set[str] | None = None
+    ) -> set[tuple[str, str]]:
+        """Recompute stale projections, return change keys of the ones that moved."""
+        changed = self.projections.recompute(dt_util.now().replace(tzinfo=None), eans)
+        return {(ean, name) for ean in changed for name in PROJECTION_FIELDS}
+
+    async def async_get_series(
+        self, ean: str, energy_type: str
+    ) -> MyLuminusTimeSeries | None:
+        """Open the series of a meter, filled from the store when it's new."""
+        if self.series_store is None:
+            return None
+        series, created = await self.hass.async_add_executor_job(
+            self.series_store.get, ean, energy_type, CONSUMPTION_PERIODICITY
+        )
+        if created and self.consumption_store is not None:
+            rows = await self.hass.async_add_executor_job(
+                self.consumption_store.all_periods,
+                ean,
+                energy_type,
+                CONSUMPTION_PERIODICITY,
+            )
+            await self.hass.async_add_executor_job(series.extend, rows)
+        self.projections.load(ean, series)
+        return series
+
+    async def async_import_statistics(
+        self, series: MyLuminusTimeSeries, ean: str, energy_type: str
+    ) -> None:
+        """Import the new hours of a series, failing doesn't fail the caller."""
+        if self.statistics is None:
+            return
+        try:
+            await self.statistics.async_import(series, ean, energy_type)
+        except HomeAssistantError as exception:
+            LOGGER.warning("importing statistics of %s failed: %s", ean, exception)
+
+    @callback
+    def async_update_projections(self, eans: set[str] | None = None) -> None:
+        """Push projections changed by newly arrived consumption to the entities."""
+        changes = self._recompute_projections(eans)
+        if not changes:
+            return
+        if not self.idle.is_set():
+            # a refresh is running, it dispatches these along with its own
+            self.changed_fields |= changes
+            return
+        self.changed_fields = changes
+        self.async_update_listeners()
+
+    async def async_load_latest_statements(self) -> None:
+        """Load the latest invoice and payment from the index."""
+        if self.statement_index is None:
+            return
+        for kind in (INVOICE, PAYMENT):
+            self.latest_statements[kind] = await self.hass.async_add_executor_job(
+                self.statement_index.latest, kind
+            )
+
+    async def _async_index_statements(self, data: dict) -> set[tuple[None, str]]:
+        """Index new or changed invoices and payments, then drop the lists."""
+        statements = data["statements"]
+        changes = set()
+        for kind, key in ((INVOICE, "Invoices"), (PAYMENT, "Payments")):
+            changed, initial = await self.hass.async_add_executor_job(
+                self.statement_index.update, kind, statements.get(key) or []
+            )
+            if not changed:
+                continue
+            # a first import is history, not news
+            if not initial:
+                for entry in changed:
+                    self.hass.bus.async_fire(f"{DOMAIN}_{kind}", entry)
+            self.latest_statements[kind] = await self.hass.async_add_executor_job(
+                self.statement_index.latest, kind
+            )
+            changes.add((None, kind))
+        # the history is on disk now, keep only the summary in memory
+        data["statements"] = {
+            key: value
+            for key, value in statements.items()
+            if key not in ("Invoices", "Payments")
+        }
+        return changes
+
+    async def async_restore(self) -> bool:
+        """Load the last known data and refresh token, False if there's none."""
+        if self._cache is None:
+            return False
+        cached = await self._cache.async_load()
+        if not cached or not cached.get("data"):
+            return False
+        LOGGER.debug("restored data from %s", cached.get("saved_at"))
+        self._cached_refresh_token = cached.get("refresh_token")
+        self.client.tokens.restore(self._cached_refresh_token)
+        data = cached["data"]
+        for name, payload in data.items():
+            self._track_change(name, payload)
+        self._process(data)
+        if "meters" in data:
+            self._async_update_meter_coordinators(data["meters"])
+        self.data = data
+        self.last_update_success = True
+        return True
+
+    @callback
+    def _async_save_cache(self, data: dict) -> None:
+        """Persist the data so a restart doesn't wait on the backend."""
+        if self._cache is None:
+            return
+        self._cached_refresh_token = self.client.tokens.refresh_token
+        self._cache.async_delay_save(
+            lambda: {
+                "saved_at": dt_util.utcnow().isoformat(),
+                "refresh_token": self._cached_refresh_token,
+                "data": data,
+            },
+            CACHE_SAVE_DELAY,
+        )
+
+    def _track_change(self, name: str, payload: any) -> None:
+        """Remember if the payload of an endpoint differs from last time."""
+        digest = fingerprint(_normalize(name, payload))
+        if self._fingerprints.get(name) != digest:
+            self._fingerprints[name] = digest
+            self.changed_endpoints.add(name)
+
+    @callback
+    def async_update_listeners(self) -> None:
+        """Only push states to the entities when their data changed."""
+        if (
+            self._dispatch_needed
+            or self.last_update_success != self._last_dispatched_success
+        ):
+            self.dispatched_updates += 1
+            self._last_dispatched_success = self.last_update_success
+            # entity state writes
+            with self._span("dispatch"):
+                super().async_update_listeners()
+        else:
+            self.skipped_updates += 1
+            LOGGER.debug(
+                "data unchanged, skipped state writes (%s skipped, %s dispatched)",
+                self.skipped_updates,
+                self.dispatched_updates,
+            )
+        # anything else pushing data, like async_set_updated_data, dispatches
+        self._dispatch_needed = True
+
+    @callback
+    def _async_update_meter_coordinators(self, meters: dict) -> None:
+        """Create coordinators for new meters and drop those of removed ones."""
+        current = {meter["Ean"]: meter for meter in meters.get("Meters", [])}
+        removed = self.meter_coordinators.keys() - current.keys()
+        added = current.keys() - self.meter_coordinators.keys()
+        for ean in removed:
+            retired = self.meter_coordinators.pop(ean)
+            retired.closing = True
+            if not retired.idle.is_set():
+                # its stores stay open until the refresh is done
+                self._retired.add(retired)
+                self.hass.async_create_task(self._async_retire(retired))
+            self.projections.discard(ean)
+            if self.backfill is not None:
+                self.backfill.async_remove_meter(ean)
+        for ean in added:
+            coordinator = MyLuminusMeterCoordinator(self, current[ean])
+            self.meter_coordinators[ean] = coordinator
+            self.hass.async_create_task(coordinator.async_refresh())
+            # fetch the older history of meters added after startup too
+            if self.backfill is not None:
+                self.backfill.async_add_meter(coordinator)
+        if added or removed:
+            # the sensor platform adds and retires meter entities
+            self.changed_fields.add(METERS)
+            self._dispatch_needed = True
+
+    async def _async_retire(self, coordinator: MyLuminusMeterCoordinator) -> None:
+        """Forget a removed meter once its last refresh is done."""
+        await coordinator.idle.wait()
+        self._retired.discard(coordinator)
+
+    @callback
+    def _async_revalidated(self, endpoint: str) -> None:
+        """A cached response changed in the background, fetch it from the cache."""
+        name = CACHED_ENDPOINTS.get(endpoint)
+        if name is None or self.closing:
+            return
+        self.scheduler.schedules[name].next_due = None
+        self.hass.async_create_task(self.async_request_refresh())
+
+    async def async_stop_refreshes(self) -> None:
+        """Stop refreshing and wait for running refreshes, before unloading."""
+        self._unsub_revalidated()
+        meters = [*self.meter_coordinators.values(), *self._retired]
+        for coordinator in (self, *meters):
+            coordinator.closing = True
+        await asyncio.gather(self.idle.wait(), *(meter.idle.wait() for meter in meters))
+
     def get_valid_language(self, hass: HomeAssistant):
         """helper to get a valid language"""
         if hass.config.language == "fr":
             return "fr"
         else:
             return "nl"
+
+
+class MyLuminusMeterCoordinator(DataUpdateCoordinator):
+    """Class to manage fetching the data of a single meter.
+
+    Each meter refreshes on its own schedule, so a slow or failing meter
+    doesn't hold back or fail the others.
+    """
+
+    def __init__(self, parent: MyLuminusCoordinator, meter: dict) -> None:
+        """Initialize."""
+        self.client = parent.client
+        self.consumption_store = parent.consumption_store
+        self._parent = parent
+        self._series: MyLuminusTimeSeries | None = None
+        self.ean = meter["Ean"]
+        self.energy_type = meter["EnergyType"]
+        sources = meter.get("Sources") or [{}]
+        self.source = sources[0].get("SourceProvider", "LuminusSap")
+        # see the parent coordinator
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.closing = False
+        super().__init__(
+            hass=parent.hass,
+            logger=LOGGER,
+            name=f"{DOMAIN} {self.ean}",
+            update_interval=METER_UPDATE_INTERVAL,
+        )
+        # refreshes run outside of the config entry context
+        self.config_entry = parent.config_entry
+
+    async def _async_update_data(self):
+        """Update data via library."""
+        if self.closing:
+            return self.data
+        self.idle.clear()
+        try:
+            return await self._async_update_meter()
+        finally:
+            self.idle.set()
+
+    async def _async_update_meter(self) -> dict:
+        """Fetch the meter data and sync its consumption history."""
+        try:
+            # the first refresh starts from a parent cycle, and later ones from
+            # a timer set in that context, neither shares its budget
+            with deadline(None), deadline(METER_CYCLE_DEADLINE_SECONDS):
+                token = await self.client.async_get_access_token()
+                try:
+                    metrics_range = await self._async_fetch_meter(token)
+                except MyLuminusApiClientAuthenticationError:
+                    # the token might have been revoked early, log in again
+                    self.client.tokens.invalidate(token)
+                    token = await self.client.async_get_access_token()
+                    try:
+                        metrics_range = await self._async_fetch_meter(token)
+                    except MyLuminusApiClientAuthenticationError as exception:
+                        # the login was accepted, the credentials are fine
+                        raise UpdateFailed(exception) from exception
+        except MyLuminusApiClientAuthenticationError as exception:
+            raise ConfigEntryAuthFailed(exception) from exception
+        except MyLuminusApiClientError as exception:
+            raise UpdateFailed(exception) from exception
+
+        last_period = None
+        if self._series is not None:
+            # read from the mapped series, no query needed
+            last_period = self._series.last()
+            self._parent.async_update_projections({self.ean})
+            await self._parent.async_import_statistics(
+                self._series, self.ean, self.energy_type
+            )
+        elif self.consumption_store is not None:
+            last_period = await self.hass.async_add_executor_job(
+                self.consumption_store.last_period,
+                self.ean,
+                self.energy_type,
+                CONSUMPTION_PERIODICITY,
+            )
+        return {"metrics_range": metrics_range, "last_period": last_period}
+
+    async def _async_fetch_meter(self, token: str) -> any:
+        """Fetch the metrics range and sync consumptions with a token."""
+        # syncing consumptions costs a round trip anyway, don't use an
+        # expired copy here
+        metrics_range = await self.client.metrics_range(
+            token=token, ean=self.ean, source=self.source, allow_stale=False
+        )
+        if self.consumption_store is not None:
+            await self._async_sync_consumptions(token)
+        return metrics_range
+
+    async def _async_sync_consumptions(self, token: str) -> None:
+        """Fetch only the periods from the last stored checkpoint onwards."""
+        if self._series is None:
+            self._series = await self._parent.async_get_series(
+                self.ean, self.energy_type
+            )
+        # the last stored period might still have been incomplete, so we
+        # request again from its start and overwrite it
+        checkpoint = await self.hass.async_add_executor_job(
+            self.consumption_store.last_period_start,
+            self.ean,
+            self.energy_type,
+            CONSUMPTION_PERIODICITY,
+        )
+        now = dt_util.now().replace(tzinfo=None)
+        date_from = checkpoint or (
+            now - timedelta(days=INITIAL_CONSUMPTION_DAYS)
+        ).replace(hour=0, minute=0, second=0, microsecond=0)
+
+        response = await self.client.consumptions(
+            token=token,
+            ean=self.ean,
+            energy_type=self.energy_type,
+            date_from=date_from,
+            date_until=now,
+            source=self.source,
+            periodicity=CONSUMPTION_PERIODICITY,
+        )
+        periods = response.get("Consumptions", [])
+        if self._series is not None:
+            # the series goes first, the store holds the sync checkpoint
+            await self.hass.async_add_executor_job(
+                self._series.extend, parse_periods(periods)
+            )
+        stored = await self.hass.async_add_executor_job(
+            self.consumption_store.add_periods,
+            self.ean,
+            self.energy_type,
+            CONSUMPTION_PERIODICITY,
+            periods,
+        )
+        LOGGER.debug("stored %s consumption periods for %s", stored, self.ean)
@@ -0,0 +1,60 @@
+"""Decode API responses once and keep only the fields we use."""
+from __future__ import annotations
+
+try:
+    from orjson import loads
+except ImportError:  # pragma: no cover
+    from json import loads
+
+from .models import LINE_FIELDS
+from .statement_index import DATE_KEYS, ID_KEYS, INVOICE, PAYMENT
+
+# fields consumed per endpoint, None keeps a value as is, a tuple of keys
+# projects a dict or every dict in a list, a dict projects per key
+PROJECTIONS: dict[str, dict | tuple | None] = {
+    "GetBudgetBillLines": {
+        "Lines": ("Ean", "Simulation", *LINE_FIELDS),
+    },
+    "GetAccountStatement": {
+        "AmountOpen": None,
+        "Invoices": (
+            *ID_KEYS[INVOICE],
+            *DATE_KEYS[INVOICE],
+            "Amount",
+            "OpenAmount",
+            "Status",
+        ),
+        "Payments": (*ID_KEYS[PAYMENT], *DATE_KEYS[PAYMENT], "Amount", "Status"),
+    },
+    "GetContracts": {
+        "Contracts": ("Ean", "EnergyType", "Product", "PriceVariability", "EndDate"),
+    },
+    "GetMetersConsumptionSources": {
+        "Meters": ("Ean", "EnergyType", "Sources"),
+    },
+    "GetConsumptions": {
+        "Consumptions": ("From", "Until", "Value"),
+    },
+}
+
+
+def project(value: any, spec: dict | tuple | None) -> any:
+    """Keep only the fields of value listed in spec."""
+    if spec is None:
+        return value
+    if isinstance(value, list):
+        return [project(item, spec) for item in value]
+    if not isinstance(value, dict):
+        return value
+    if isinstance(spec, dict):
+        return {
+            key: project(value[key], sub) for key, sub in spec.items() if key in value
+        }
+    return {key: value[key] for key in spec if key in value}
+
+
+def decode_response(endpoint: str, body: bytes) -> any:
+    """Parse a response body and project it for its endpoint."""
+    if not body:
+        return None
+    return project(loads(body), PROJECTIONS.get(endpoint))
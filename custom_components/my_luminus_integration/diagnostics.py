@@ -0,0 +1,39 @@
+"""Diagnostics support for the integration."""
+from __future__ import annotations
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+from .coordinator import MyLuminusCoordinator
+
+TO_REDACT = {CONF_PASSWORD, CONF_USERNAME}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict:
+    """Return request metrics and update statistics of a config entry."""
+    coordinator: MyLuminusCoordinator = hass.data[DOMAIN][entry.entry_id]
+    return {
+        "entry": async_redact_data(entry.as_dict(), TO_REDACT),
+        "metrics": coordinator.client.metrics.as_dict(),
+        "circuit": coordinator.client.circuit.state,
+        "updates": {
+            "dispatched": coordinator.dispatched_updates,
+            "skipped": coordinator.skipped_updates,
+        },
+        "endpoint_errors": sorted(coordinator.endpoint_errors),
+        "schedule": {
+            name: {
+                "interval": str(schedule.interval),
+                "next_due": schedule.next_due.isoformat()
+                if schedule.next_due
+                else None,
+            }
+            for name, schedule in coordinator.scheduler.schedules.items()
+        },
+        "outbox_pending": coordinator.outbox.pending if coordinator.outbox else 0,
+    }
@@ -1,6 +1,7 @@
 """Entity class."""
 from __future__ import annotations
 
+from homeassistant.core import callback
 from homeassistant.helpers.entity import DeviceInfo
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
@@ -13,6 +14,10 @@ class MyLuminusEntity(CoordinatorEntity):
 
     _attr_attribution = ATTRIBUTION
 
+    # (EAN, field) this entity renders, None to write state on every update
+    _change_key: tuple[str | None, str] | None = None
+    _was_available: bool | None = None
+
     def __init__(self, coordinator: MyLuminusCoordinator) -> None:
         """Initialize."""
         super().__init__(coordinator)
@@ -28,3 +33,15 @@ class MyLuminusEntity(CoordinatorEntity):
             model=VERSION,
             manufacturer=NAME,
         )
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Only write state when our own field changed or availability flipped."""
+        available = self.available
+        if (
+            self._change_key is None
+            or self._change_key in self.coordinator.changed_fields
+            or available != self._was_available
+        ):
+            self._was_available = available
+            self.async_write_ha_state()
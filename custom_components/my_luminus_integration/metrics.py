@@ -0,0 +1,138 @@
+"""Per endpoint request metrics of the API client."""
+from __future__ import annotations
+
+from bisect import bisect_left
+from collections import deque
+import math
+
+# upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# successful requests kept for recent_percentile, older ones are forgotten
+RECENT_LATENCIES = 100
+
+
+def endpoint_name(url: str) -> str:
+    """Name an endpoint after the last part of its url, like GetContracts."""
+    return url.split("?", 1)[0].rsplit("/", 1)[-1]
+
+
+class EndpointMetrics:
+    """Counters for a single endpoint, cheap enough to update on every call."""
+
+    __slots__ = (
+        "requests",
+        "latency_buckets",
+        "latency_total",
+        "recent_latencies",
+        "response_bytes",
+        "status_codes",
+        "timeouts",
+        "auth_failures",
+        "errors",
+        "coalesced",
+        "cache_hits",
+        "hedged",
+        "hedge_wins",
+    )
+
+    def __init__(self) -> None:
+        self.requests = 0
+        # one extra bucket for anything slower than the last bound
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_total = 0.0
+        # latencies of the last successful requests, oldest first
+        self.recent_latencies: deque[float] = deque(maxlen=RECENT_LATENCIES)
+        self.response_bytes = 0
+        self.status_codes: dict[int, int] = {}
+        self.timeouts = 0
+        self.auth_failures = 0
+        self.errors = 0
+        # calls answered without a request of their own
+        self.coalesced = 0
+        self.cache_hits = 0
+        # slow requests sent a second time, and how often that one was first
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def record_latency(self, latency: float, success: bool = True) -> None:
+        """Count a finished request, only successful ones are recent latencies."""
+        self.requests += 1
+        self.latency_total += latency
+        self.latency_buckets[bisect_left(LATENCY_BUCKETS, latency)] += 1
+        if success:
+            self.recent_latencies.append(latency)
+
+    def record_status(self, status: int) -> None:
+        """Count a response status code."""
+        self.status_codes[status] = self.status_codes.get(status, 0) + 1
+
+    @property
+    def mean_latency(self) -> float | None:
+        """Average latency in seconds."""
+        if not self.requests:
+            return None
+        return self.latency_total / self.requests
+
+    def percentile(self, percent: float) -> float | None:
+        """Approximate latency percentile, the upper bound of its bucket."""
+        if not self.requests:
+            return None
+        rank = percent / 100 * self.requests
+        seen = 0
+        for index, count in enumerate(self.latency_buckets):
+            seen += count
+            if seen >= rank and count:
+                if index < len(LATENCY_BUCKETS):
+                    return LATENCY_BUCKETS[index]
+                return float("inf")
+        return None
+
+    def recent_percentile(self, percent: float) -> float | None:
+        """Latency percentile of the last successful requests.
+
+        Unlike percentile, an outage or a slow morning is forgotten after
+        RECENT_LATENCIES good answers, and failures don't count at all.
+        """
+        if not self.recent_latencies:
+            return None
+        latencies = sorted(self.recent_latencies)
+        rank = math.ceil(percent / 100 * len(latencies))
+        return latencies[max(rank, 1) - 1]
+
+    def as_dict(self) -> dict:
+        """Export for diagnostics and entity attributes."""
+        buckets = [*map(str, LATENCY_BUCKETS), "+Inf"]
+        return {
+            "requests": self.requests,
+            "mean_latency": self.mean_latency,
+            "p50_latency": self.percentile(50),
+            "p95_latency": self.percentile(95),
+            "latency_histogram": dict(zip(buckets, self.latency_buckets)),
+            "response_bytes": self.response_bytes,
+            "status_codes": dict(self.status_codes),
+            "timeouts": self.timeouts,
+            "auth_failures": self.auth_failures,
+            "errors": self.errors,
+            "coalesced": self.coalesced,
+            "cache_hits": self.cache_hits,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+        }
+
+
+class MyLuminusMetrics:
+    """Metrics of all endpoints called by a client."""
+
+    def __init__(self) -> None:
+        self.endpoints: dict[str, EndpointMetrics] = {}
+
+    def endpoint(self, name: str) -> EndpointMetrics:
+        """Return the metrics of an endpoint, created on first use."""
+        metrics = self.endpoints.get(name)
+        if metrics is None:
+            metrics = self.endpoints[name] = EndpointMetrics()
+        return metrics
+
+    def as_dict(self) -> dict:
+        """Export all endpoints."""
+        return {name: metrics.as_dict() for name, metrics in self.endpoints.items()}
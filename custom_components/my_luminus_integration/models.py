@@ -0,0 +1,98 @@
+"""Typed records parsed once per update from the API responses."""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+
+# budget line fields shown as sensors, mapped to their record attribute
+LINE_FIELDS = {
+    "NextInvoiceDate": "next_invoice_date",
+    "CurrentAmount": "current_amount",
+    "IdealAmount": "ideal_amount",
+    "MinimumAmount": "minimum_amount",
+    "MaximumAmount": "maximum_amount",
+    "CurrentSettlementAmount": "current_settlement_amount",
+    "SubTotal": "sub_total",
+    "OpenSlices": "open_slices",
+}
+
+# change key of the open amount, it isn't tied to an EAN
+AMOUNT_OPEN = (None, "AmountOpen")
+# change key for meters that were added or removed
+METERS = (None, "Meters")
+
+
+def _number(value: any) -> float | None:
+    """Parse numeric values, None for anything else."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass(slots=True)
+class BudgetLine:
+    """Budget bill line of one EAN."""
+
+    ean: str
+    next_invoice_date: str | None
+    current_amount: float | None
+    ideal_amount: float | None
+    minimum_amount: float | None
+    maximum_amount: float | None
+    current_settlement_amount: float | None
+    sub_total: float | None
+    open_slices: float | None
+
+    @classmethod
+    def from_api(cls, line: dict) -> BudgetLine:
+        """Parse a line from GetBudgetBillLines."""
+        return cls(
+            ean=line["Ean"],
+            next_invoice_date=line.get("NextInvoiceDate"),
+            current_amount=_number(line.get("CurrentAmount")),
+            ideal_amount=_number(line.get("IdealAmount")),
+            minimum_amount=_number(line.get("MinimumAmount")),
+            maximum_amount=_number(line.get("MaximumAmount")),
+            current_settlement_amount=_number(line.get("CurrentSettlementAmount")),
+            sub_total=_number(line.get("SubTotal")),
+            open_slices=_number(line.get("OpenSlices")),
+        )
+
+
+@dataclass(slots=True)
+class MyLuminusSnapshot:
+    """Everything the sensors show, indexed by EAN."""
+
+    lines: dict[str, BudgetLine] = field(default_factory=dict)
+    amount_open: float | None = None
+
+    @classmethod
+    def from_api(cls, budget: dict, statements: dict) -> MyLuminusSnapshot:
+        """Parse the budget and statement responses."""
+        lines = {}
+        for line in budget.get("Lines", []):
+            record = BudgetLine.from_api(line)
+            lines[record.ean] = record
+        amount_open = (statements.get("AmountOpen") or {}).get("Value")
+        return cls(lines=lines, amount_open=_number(amount_open))
+
+    def value(self, ean: str, attribute: str) -> float | str | None:
+        """Return a field of the line of an EAN, by record attribute."""
+        line = self.lines.get(ean)
+        if line is None:
+            return None
+        return getattr(line, attribute)
+
+    def changes(self, previous: MyLuminusSnapshot) -> set[tuple[str | None, str]]:
+        """(EAN, field) keys whose value differs from the previous snapshot."""
+        changed = set()
+        for ean, line in self.lines.items():
+            old = previous.lines.get(ean)
+            for name, attribute in LINE_FIELDS.items():
+                if old is None or getattr(old, attribute) != getattr(line, attribute):
+                    changed.add((ean, name))
+        for ean in previous.lines.keys() - self.lines.keys():
+            changed.update((ean, name) for name in LINE_FIELDS)
+        if self.amount_open != previous.amount_open:
+            changed.add(AMOUNT_OPEN)
+        return changed
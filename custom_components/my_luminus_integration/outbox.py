@@ -0,0 +1,176 @@
+"""Persisted queue of meter readings waiting to be submitted."""
+from __future__ import annotations
+
+import asyncio
+from datetime import date, timedelta
+
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+
+from .api import MyLuminusApiClient, MyLuminusApiClientError
+from .const import DOMAIN, LOGGER, OUTBOX_BATCH_SIZE, OUTBOX_MAX_ATTEMPTS
+
+STORAGE_VERSION = 1
+SAVE_DELAY = 5
+
+# how long we remember submitted days, to replace instead of insert twice
+SUBMITTED_RETENTION = timedelta(days=7)
+
+# retry delays grow from the first to the last value
+RETRY_DELAY = 30
+MAX_RETRY_DELAY = 3600
+
+
+class MyLuminusOutbox:
+    """Meter readings collapsed per EAN and day, submitted in the background.
+
+    The API allows one reading per day, so a newer reading for the same EAN
+    and day replaces the queued one. When that day was already submitted by
+    the time it's sent the old reading is deleted first.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        client: MyLuminusApiClient,
+        entry_id: str,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+    ) -> None:
+        self._hass = hass
+        self._client = client
+        self._batch_size = batch_size
+        self._store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}.outbox")
+        self._pending: dict[str, dict] = {}  # "ean|date" to queued reading
+        self._submitted: dict[str, str] = {}  # "ean|date" to submitted date
+        self._failures = 0
+        self._flush_task: asyncio.Task | None = None
+        self._unsub_retry: CALLBACK_TYPE | None = None
+
+    @property
+    def pending(self) -> int:
+        """Number of readings waiting to be submitted."""
+        return len(self._pending)
+
+    async def async_load(self) -> None:
+        """Restore readings queued before a restart and submit them."""
+        data = await self._store.async_load() or {}
+        self._pending = data.get("pending", {})
+        self._submitted = data.get("submitted", {})
+        if self._pending:
+            LOGGER.debug("restored %s queued meter readings", len(self._pending))
+            self.async_schedule_flush()
+
+    @callback
+    def async_enqueue(self, ean: str, day: date, payload: dict) -> None:
+        """Queue a reading, this returns right away."""
+        key = f"{ean}|{day.isoformat()}"
+        self._pending[key] = {
+            "reading": {**payload, "Ean": ean, "Date": day.isoformat()},
+            "attempts": 0,
+        }
+        self._async_save()
+        self.async_schedule_flush()
+
+    @callback
+    def async_schedule_flush(self) -> None:
+        """Start submitting unless that's already going on."""
+        if self._unsub_retry is not None:
+            self._unsub_retry()
+            self._unsub_retry = None
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = self._hass.async_create_task(self._async_flush())
+
+    async def async_shutdown(self) -> None:
+        """Stop submitting and write the queue to disk."""
+        if self._unsub_retry is not None:
+            self._unsub_retry()
+            self._unsub_retry = None
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        await self._store.async_save(self._data_to_save())
+
+    async def _async_flush(self) -> None:
+        """Submit batches until the queue is empty or a batch had failures."""
+        while self._pending:
+            try:
+                token = await self._client.async_get_access_token()
+            except MyLuminusApiClientError as exception:
+                LOGGER.warning("can't submit meter readings: %s", exception)
+                self._async_retry_later()
+                return
+
+            batch = list(self._pending.items())[: self._batch_size]
+            results = await asyncio.gather(
+                *(self._async_submit(token, key, entry) for key, entry in batch),
+                return_exceptions=True,
+            )
+
+            failed = False
+            for (key, entry), result in zip(batch, results):
+                if isinstance(result, MyLuminusApiClientError):
+                    failed = True
+                    entry["attempts"] += 1
+                    if entry["attempts"] >= OUTBOX_MAX_ATTEMPTS:
+                        LOGGER.error("giving up on meter reading %s: %s", key, result)
+                        self._pending.pop(key, None)
+                    else:
+                        LOGGER.warning(
+                            "meter reading %s not submitted: %s", key, result
+                        )
+                elif isinstance(result, BaseException):
+                    raise result
+                else:
+                    self._submitted[key] = dt_util.now().date().isoformat()
+                    # a newer reading for the same day might have been queued
+                    if self._pending.get(key) is entry:
+                        del self._pending[key]
+
+            self._prune_submitted()
+            self._async_save()
+            if failed:
+                self._async_retry_later()
+                return
+            self._failures = 0
+
+    async def _async_submit(self, token: str, key: str, entry: dict) -> None:
+        """Submit one reading, deleting the one of that day first if needed."""
+        reading = entry["reading"]
+        # decided now, the reading of that day might have been sent meanwhile
+        if key in self._submitted:
+            await self._client.delete_meter_reading(
+                token=token, ean=reading["Ean"], date=reading["Date"]
+            )
+            # gone, a retry after a failed insert mustn't delete again
+            del self._submitted[key]
+            self._async_save()
+        await self._client.insert_meter_reading(token=token, reading=reading)
+
+    @callback
+    def _async_retry_later(self) -> None:
+        """Plan another flush with exponential backoff."""
+        delay = min(RETRY_DELAY * 2**self._failures, MAX_RETRY_DELAY)
+        self._failures += 1
+
+        @callback
+        def _retry(_now) -> None:
+            self._unsub_retry = None
+            self.async_schedule_flush()
+
+        self._unsub_retry = async_call_later(self._hass, delay, _retry)
+
+    def _prune_submitted(self) -> None:
+        """Forget submitted days we won't be asked to replace anymore."""
+        oldest = (dt_util.now().date() - SUBMITTED_RETENTION).isoformat()
+        self._submitted = {
+            key: day for key, day in self._submitted.items() if day >= oldest
+        }
+
+    @callback
+    def _async_save(self) -> None:
+        self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+
+    @callback
+    def _data_to_save(self) -> dict:
+        return {"pending": self._pending, "submitted": self._submitted}
@@ -0,0 +1,105 @@
+"""Sampling profiler and phase timings for coordinator cycles."""
+from __future__ import annotations
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+# deeper stacks are cut off at the root end
+MAX_STACK_DEPTH = 64
+
+
+def _label(frame) -> str:
+    """Name a frame after its function, file and first line."""
+    code = frame.f_code
+    filename = os.path.basename(code.co_filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class MyLuminusProfiler:
+    """Samples the stacks of all threads and times the phases of cycles.
+
+    A background thread takes a sample of every other thread each interval,
+    the event loop shows up idle in select while waiting on the network and
+    the recorder in its own thread. Stacks are kept folded, one line per
+    distinct stack with its sample count, which flame graph tools read.
+    Phases are timed with span, in wall clock time.
+    """
+
+    def __init__(self, interval: float = 0.005) -> None:
+        self._interval = interval
+        self._stacks: Counter[str] = Counter()
+        self._samples = 0
+        self._thread: threading.Thread | None = None
+        self._stopped = threading.Event()
+        self.spans: dict[str, list[float]] = defaultdict(list)
+
+    def start(self) -> None:
+        """Start sampling."""
+        self._thread = threading.Thread(
+            target=self._run, name="my_luminus_profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop sampling, this waits for the sampling thread."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stopped.wait(self._interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            # pylint: disable-next=protected-access
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    stack.append(_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self._stacks[";".join(reversed(stack))] += 1
+            self._samples += 1
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """Time a phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans[name].append(time.perf_counter() - start)
+
+    def summary(self) -> dict:
+        """Timing per phase in milliseconds, and how much was sampled."""
+        return {
+            "sample_interval_ms": self._interval * 1000,
+            "samples": self._samples,
+            "phases": {
+                name: {
+                    "count": len(durations),
+                    "total_ms": round(sum(durations) * 1000, 3),
+                    "mean_ms": round(sum(durations) / len(durations) * 1000, 3),
+                    "max_ms": round(max(durations) * 1000, 3),
+                }
+                for name, durations in sorted(self.spans.items())
+            },
+        }
+
+    def write(self, prefix: str) -> list[str]:
+        """Write the folded stacks and the summary, this does blocking IO."""
+        stacks_path = prefix + ".folded"
+        summary_path = prefix + ".json"
+        with open(stacks_path, "w", encoding="utf-8") as file:
+            for stack, count in self._stacks.most_common():
+                file.write(f"{stack} {count}\n")
+        with open(summary_path, "w", encoding="utf-8") as file:
+            json.dump(self.summary(), file, indent=2)
+        return [stacks_path, summary_path]
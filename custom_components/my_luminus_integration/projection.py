@@ -0,0 +1,241 @@
+"""Projected cost and settlement, computed over memory mapped consumption."""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from .const import (
+    PROJECTION_DEFAULT_WINDOW_DAYS,
+    PROJECTION_MIN_COVERAGE_DAYS,
+    PROJECTION_WINDOW_DAYS,
+)
+from .consumption_store import from_epoch, to_epoch
+from .timeseries import MyLuminusTimeSeries
+
+DAY = 24 * 3600
+YEAR = 365 * DAY
+MONTH = YEAR / 12
+
+# sensors rendering a projection, also their change keys per EAN
+PROJECTED_COST = "ProjectedCost"
+EXPECTED_SETTLEMENT = "ExpectedSettlement"
+PROJECTION_FIELDS = (PROJECTED_COST, EXPECTED_SETTLEMENT)
+
+
+def _number(value: any) -> float:
+    """Parse numeric values, NaN for anything else so arrays stay float."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _finite(value: float) -> float | None:
+    """Round to cents, None for results we couldn't compute."""
+    return round(float(value), 2) if np.isfinite(value) else None
+
+
+@dataclass(frozen=True, slots=True)
+class ProjectionInputs:
+    """What the projection of one EAN needs from the budget and contract."""
+
+    period_from: int
+    period_until: int
+    ideal_amount: float
+    paid_amount: float
+    current_amount: float
+    open_advances: float
+    product: str | None
+    price_variability: str | None
+
+    @classmethod
+    def from_api(cls, line: dict, contract: dict) -> ProjectionInputs | None:
+        """Parse a budget line with its simulation, None when there is none."""
+        simulation = line.get("Simulation") or {}
+        try:
+            period_from = to_epoch(simulation["FromDate"])
+            # the simulation runs until the end of its last day
+            period_until = to_epoch(simulation["ToDate"]) + DAY
+        except (KeyError, TypeError, ValueError):
+            return None
+        open_advances = simulation.get("OpenInvoicesCount")
+        if open_advances is None:
+            open_advances = line.get("OpenSlices")
+        return cls(
+            period_from=period_from,
+            period_until=period_until,
+            ideal_amount=_number(
+                simulation.get("IdealAmount", line.get("IdealAmount"))
+            ),
+            paid_amount=_number(simulation.get("PaidAmount")),
+            current_amount=_number(line.get("CurrentAmount")),
+            open_advances=_number(open_advances),
+            product=contract.get("Product"),
+            price_variability=contract.get("PriceVariability"),
+        )
+
+    @property
+    def window(self) -> int:
+        """Seconds of recent consumption that set the pace."""
+        days = PROJECTION_WINDOW_DAYS.get(
+            self.price_variability, PROJECTION_DEFAULT_WINDOW_DAYS
+        )
+        return days * DAY
+
+
+@dataclass(frozen=True, slots=True)
+class Projection:
+    """Projected consumption and cost of one EAN for its simulation period."""
+
+    period_from: str
+    period_until: str
+    unit_price: float | None
+    projected_consumption: float | None
+    projected_cost: float | None
+    expected_settlement: float | None
+    product: str | None
+    price_variability: str | None
+
+    def as_dict(self) -> dict:
+        """Attributes shown next to the sensor state."""
+        return {
+            "period_from": self.period_from,
+            "period_until": self.period_until,
+            "unit_price": self.unit_price,
+            "projected_consumption": self.projected_consumption,
+            "product": self.product,
+            "price_variability": self.price_variability,
+        }
+
+
+class MyLuminusProjectionEngine:
+    """Project the cost of the running simulation period and its settlement.
+
+    The unit price is calibrated from the monthly advance Luminus proposes
+    (IdealAmount) against the consumption of the year before the simulation
+    period, which the advance is based on. Consumption still to come is
+    extrapolated at the pace of the recent window, chosen by the contract's
+    PriceVariability. The settlement is what's left after the advances paid
+    and still to pay.
+    """
+
+    def __init__(self) -> None:
+        self.series: dict[str, MyLuminusTimeSeries] = {}
+        self.inputs: dict[str, ProjectionInputs] = {}
+        self.projections: dict[str, Projection] = {}
+        # (series version, inputs, day) each projection was computed for
+        self._computed: dict[str, tuple] = {}
+
+    def load(self, ean: str, series: MyLuminusTimeSeries) -> None:
+        """Project from the series of an EAN, it's read in place."""
+        self.series[ean] = series
+
+    def discard(self, ean: str) -> None:
+        """Forget a removed EAN."""
+        self.series.pop(ean, None)
+        self.projections.pop(ean, None)
+        self._computed.pop(ean, None)
+
+    def set_inputs(self, budget: dict, contracts: dict) -> None:
+        """Take the budget lines and contracts of the last update."""
+        by_ean = {
+            contract.get("Ean"): contract for contract in contracts.get("Contracts", [])
+        }
+        inputs = {}
+        for line in budget.get("Lines", []):
+            parsed = ProjectionInputs.from_api(line, by_ean.get(line["Ean"], {}))
+            if parsed is not None:
+                inputs[line["Ean"]] = parsed
+        self.inputs = inputs
+
+    def recompute(self, now: datetime, eans: set[str] | None = None) -> set[str]:
+        """Recompute the projections that are stale, return the EANs that changed.
+
+        Projections are only redone when periods arrived, the inputs changed
+        or the day rolled over, the math runs on all stale EANs at once.
+        """
+        moment = to_epoch(now.isoformat())
+        day = moment // DAY
+        stale = []
+        for ean in self.series.keys() & self.inputs.keys():
+            if eans is not None and ean not in eans:
+                continue
+            key = (self.series[ean].version, self.inputs[ean], day)
+            if self._computed.get(ean) != key:
+                self._computed[ean] = key
+                stale.append(ean)
+        if not stale:
+            return set()
+
+        inputs = [self.inputs[ean] for ean in stale]
+        period_from = np.array([item.period_from for item in inputs], dtype=np.int64)
+        period_until = np.array([item.period_until for item in inputs], dtype=np.int64)
+        window = np.array([item.window for item in inputs], dtype=np.int64)
+        until = np.minimum(moment, period_until)
+
+        # reference year, the period so far and the recent window per EAN
+        bounds = np.stack(
+            (
+                np.stack((period_from - YEAR, period_from), axis=1),
+                np.stack((period_from, until), axis=1),
+                np.stack((moment - window, np.full_like(window, moment)), axis=1),
+            ),
+            axis=1,
+        )
+        totals = np.empty((len(stale), 3), dtype=np.float64)
+        covered = np.empty((len(stale), 3), dtype=np.float64)
+        for row, ean in enumerate(stale):
+            totals[row], covered[row] = self.series[ean].totals(bounds[row])
+
+        def attribute(name: str) -> np.ndarray:
+            return np.array([getattr(item, name) for item in inputs], dtype=np.float64)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rate = np.where(
+                covered >= PROJECTION_MIN_COVERAGE_DAYS * DAY,
+                totals / covered,
+                np.nan,
+            )
+            # without a year of history the recent pace stands in for it
+            reference_rate = np.where(np.isnan(rate[:, 0]), rate[:, 2], rate[:, 0])
+            length = period_until - period_from
+            advances = np.maximum(np.round(length / MONTH), 1)
+            unit_price = (
+                attribute("ideal_amount") * advances / (reference_rate * length)
+            )
+            # gaps and the rest of the period are filled at the recent pace
+            missing = np.maximum(length - covered[:, 1], 0)
+            consumption = totals[:, 1] + rate[:, 2] * missing
+            cost = unit_price * consumption
+            settlement = (
+                cost
+                - np.nan_to_num(attribute("paid_amount"))
+                - attribute("current_amount")
+                * np.nan_to_num(attribute("open_advances"))
+            )
+
+        changed = set()
+        for row, ean in enumerate(stale):
+            item = inputs[row]
+            projection = Projection(
+                period_from=from_epoch(item.period_from).date().isoformat(),
+                period_until=(
+                    from_epoch(item.period_until) - timedelta(days=1)
+                ).date().isoformat(),
+                unit_price=(
+                    round(float(unit_price[row]), 4)
+                    if np.isfinite(unit_price[row])
+                    else None
+                ),
+                projected_consumption=_finite(consumption[row]),
+                projected_cost=_finite(cost[row]),
+                expected_settlement=_finite(settlement[row]),
+                product=item.product,
+                price_variability=item.price_variability,
+            )
+            if self.projections.get(ean) != projection:
+                self.projections[ean] = projection
+                changed.add(ean)
+        return changed
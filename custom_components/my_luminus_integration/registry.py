@@ -0,0 +1,170 @@
+"""API clients shared by all config entries of the integration."""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import time
+from collections import deque
+
+import aiohttp
+from homeassistant.const import EVENT_HOMEASSISTANT_CLOSE
+from homeassistant.core import CALLBACK_TYPE, Event, HomeAssistant
+from homeassistant.helpers.storage import Store
+from homeassistant.util import ssl as ssl_util
+
+from .api import MyLuminusApiClient
+from .cache import MyLuminusResponseCache
+from .resilience import MyLuminusCircuitBreaker
+from .const import (
+    CONNECTION_POOL_SIZE,
+    DATA_CLIENTS,
+    DOMAIN,
+    RATE_LIMIT_BURST,
+    RATE_LIMIT_PER_SECOND,
+)
+
+RESPONSE_CACHE_VERSION = 1
+
+
+def response_cache_key(username: str) -> str:
+    """Storage key of the response cache of a login, without the username."""
+    digest = hashlib.blake2b(username.encode(), digest_size=8).hexdigest()
+    return f"{DOMAIN}.responses.{digest}"
+
+
+class MyLuminusRateLimiter:
+    """Token bucket shared by all clients.
+
+    When the bucket is empty callers queue per owner and owners are served
+    round robin, so one busy account can't starve the others.
+    """
+
+    def __init__(self, rate: float, burst: int) -> None:
+        self._rate = rate
+        self._burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._waiters: dict[str, deque[asyncio.Future]] = {}
+        self._turns: deque[str] = deque()
+        self._pump: asyncio.Task | None = None
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        refill = (now - self._updated) * self._rate
+        self._tokens = min(self._burst, self._tokens + refill)
+        self._updated = now
+
+    async def acquire(self, owner: str) -> None:
+        """Wait for a token, in turn with the other owners."""
+        self._refill()
+        if not self._turns and self._tokens >= 1:
+            self._tokens -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        queue = self._waiters.setdefault(owner, deque())
+        if not queue:
+            self._turns.append(owner)
+        queue.append(future)
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.ensure_future(self._async_pump())
+        await future
+
+    async def _async_pump(self) -> None:
+        """Hand out tokens as they become available, one owner at a time."""
+        while self._turns:
+            self._refill()
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+                continue
+            owner = self._turns.popleft()
+            queue = self._waiters[owner]
+            future = queue.popleft()
+            if queue:
+                self._turns.append(owner)
+            else:
+                del self._waiters[owner]
+            # callers that gave up don't use a token
+            if not future.done():
+                self._tokens -= 1
+                future.set_result(None)
+
+
+class MyLuminusClientRegistry:
+    """One client per username on a shared connection pool and rate limit.
+
+    Config entries for the same login share the client and so its token.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._hass = hass
+        self._session: aiohttp.ClientSession | None = None
+        self._unsub_close: CALLBACK_TYPE | None = None
+        self.limiter = MyLuminusRateLimiter(RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST)
+        # all accounts talk to the same backend, so they back off together
+        self.circuit = MyLuminusCircuitBreaker()
+        self._clients: dict[str, MyLuminusApiClient] = {}
+        self._entries: dict[str, set[str]] = {}  # username to entry ids
+
+    def async_get_client(
+        self, entry_id: str, username: str, password: str
+    ) -> MyLuminusApiClient:
+        """Return the client for a login, created on first use."""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=CONNECTION_POOL_SIZE,
+                    limit_per_host=CONNECTION_POOL_SIZE,
+                    ttl_dns_cache=300,
+                    keepalive_timeout=60,
+                    ssl=ssl_util.client_context(),
+                )
+            )
+            # entries aren't unloaded on shutdown, close the pool ourselves
+            self._unsub_close = self._hass.bus.async_listen_once(
+                EVENT_HOMEASSISTANT_CLOSE, self._async_close_session
+            )
+        client = self._clients.get(username)
+        if client is None or not client.has_password(password):
+            client = self._clients[username] = MyLuminusApiClient(
+                username=username,
+                password=password,
+                session=self._session,
+                limiter=self.limiter,
+                circuit=self.circuit,
+                cache=MyLuminusResponseCache(
+                    store=Store(
+                        self._hass,
+                        RESPONSE_CACHE_VERSION,
+                        response_cache_key(username),
+                    )
+                ),
+            )
+        self._entries.setdefault(username, set()).add(entry_id)
+        return client
+
+    async def async_release(self, entry_id: str, username: str) -> None:
+        """Drop an entry, closing the pool when no clients are left."""
+        entries = self._entries.get(username, set())
+        entries.discard(entry_id)
+        if not entries:
+            self._entries.pop(username, None)
+            self._clients.pop(username, None)
+        if not self._clients and self._session is not None:
+            if self._unsub_close is not None:
+                self._unsub_close()
+            await self._async_close_session()
+
+    async def _async_close_session(self, _event: Event | None = None) -> None:
+        """Close the connection pool."""
+        self._unsub_close = None
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+def async_get_registry(hass: HomeAssistant) -> MyLuminusClientRegistry:
+    """Return the registry, kept in hass.data[DOMAIN]."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if DATA_CLIENTS not in domain_data:
+        domain_data[DATA_CLIENTS] = MyLuminusClientRegistry(hass)
+    return domain_data[DATA_CLIENTS]
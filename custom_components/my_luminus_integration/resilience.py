@@ -0,0 +1,146 @@
+"""Retry policy, circuit breaker and time budgets for calls to the API."""
+from __future__ import annotations
+
+import random
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+
+from homeassistant.util import dt as dt_util
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+# monotonic time by which the calls of the current refresh should be done,
+# tasks started within a budget inherit it
+_DEADLINE: ContextVar[float | None] = ContextVar(
+    "my_luminus_deadline", default=None
+)
+
+
+@contextmanager
+def deadline(seconds: float | None) -> Iterator[None]:
+    """Give the calls made within this block a time budget.
+
+    A nested budget never extends the one around it, None lifts the budget
+    for work that outlives its caller.
+    """
+    expires = None
+    if seconds is not None:
+        expires = time.monotonic() + seconds
+        current = _DEADLINE.get()
+        if current is not None:
+            expires = min(expires, current)
+    token = _DEADLINE.set(expires)
+    try:
+        yield
+    finally:
+        _DEADLINE.reset(token)
+
+
+def remaining_budget() -> float | None:
+    """Seconds left of the current budget, None without one."""
+    expires = _DEADLINE.get()
+    if expires is None:
+        return None
+    return max(expires - time.monotonic(), 0.0)
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Seconds to wait from a Retry-After header, in seconds or as a date."""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max((retry_at - dt_util.utcnow()).total_seconds(), 0.0)
+
+
+@dataclass
+class MyLuminusRetryPolicy:
+    """Exponential backoff with full jitter, only for idempotent calls."""
+
+    attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+
+    def delay(self, attempt: int, retry_after: float | None = None) -> float | None:
+        """Seconds to wait before the next attempt, None to give up."""
+        if attempt + 1 >= self.attempts:
+            return None
+        if retry_after is not None:
+            # the server asks for more patience than a refresh has, give up
+            return retry_after if retry_after <= self.max_delay else None
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+
+class MyLuminusCircuitBreaker:
+    """Stops calls while the backend keeps failing.
+
+    Opens after failure_threshold consecutive failures. After reset_timeout a
+    single half open probe is let through, success closes the circuit again
+    and failure opens it for twice as long, up to max_reset_timeout.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 60,
+        max_reset_timeout: float = 900,
+    ) -> None:
+        self._failure_threshold = failure_threshold
+        self._base_reset_timeout = reset_timeout
+        self._max_reset_timeout = max_reset_timeout
+        self._reset_timeout = reset_timeout
+        self._failures = 0
+        self._state = STATE_CLOSED
+        self._opened_at = 0.0
+
+    @property
+    def state(self) -> str:
+        """Current state, probing is possible once the timeout passed."""
+        if self._state == STATE_OPEN and self.seconds_until_probe() == 0:
+            return STATE_HALF_OPEN
+        return self._state
+
+    def seconds_until_probe(self) -> float:
+        """Seconds before calls are let through again, 0 when they are."""
+        if self._state == STATE_CLOSED:
+            return 0.0
+        return max(self._opened_at + self._reset_timeout - time.monotonic(), 0.0)
+
+    def allow(self) -> bool:
+        """Return True when a call may go out."""
+        if self._state == STATE_CLOSED:
+            return True
+        if self.seconds_until_probe() > 0:
+            return False
+        # let one probe through, the others wait for another timeout
+        self._state = STATE_HALF_OPEN
+        self._opened_at = time.monotonic()
+        return True
+
+    def record_success(self) -> None:
+        """The backend answered, close the circuit."""
+        self._failures = 0
+        self._state = STATE_CLOSED
+        self._reset_timeout = self._base_reset_timeout
+
+    def record_failure(self) -> None:
+        """The backend failed, open the circuit when that keeps happening."""
+        self._failures += 1
+        if self._state == STATE_HALF_OPEN:
+            self._reset_timeout = min(self._reset_timeout * 2, self._max_reset_timeout)
+        elif self._failures < self._failure_threshold:
+            return
+        self._state = STATE_OPEN
+        self._opened_at = time.monotonic()
@@ -0,0 +1,134 @@
+"""Per endpoint refresh intervals that adapt to how often data changes."""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+
+# poll faster this many days before and after a NextInvoiceDate
+INVOICE_WINDOW_DAYS = 2
+
+# never wake up the coordinator more often than this
+MINIMUM_WAKEUP = timedelta(minutes=1)
+
+
+@dataclass
+class EndpointSchedule:
+    """Refresh interval for one endpoint.
+
+    The interval grows by backoff each time the data comes back unchanged, up to
+    max_interval, and snaps back to base_interval as soon as it changes. Around
+    an invoice date invoice_interval is used as an upper bound.
+    """
+
+    base_interval: timedelta
+    max_interval: timedelta
+    invoice_interval: timedelta | None = None
+    backoff: float = 2.0
+    interval: timedelta = field(init=False)
+    next_due: datetime | None = field(default=None, init=False)
+
+    def __post_init__(self) -> None:
+        self.interval = self.base_interval
+
+    def is_due(self, now: datetime) -> bool:
+        """Return True when this endpoint should be fetched."""
+        return self.next_due is None or now >= self.next_due
+
+    def record(self, now: datetime, changed: bool, invoice_window: bool) -> None:
+        """Plan the next fetch after a successful one."""
+        if changed:
+            self.interval = self.base_interval
+        else:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+        interval = self.interval
+        if invoice_window and self.invoice_interval is not None:
+            interval = min(interval, self.invoice_interval)
+        self.next_due = now + interval
+
+    def record_failure(self, now: datetime) -> None:
+        """Retry a failed fetch after the base interval."""
+        self.next_due = now + self.base_interval
+
+
+def default_schedules() -> dict[str, EndpointSchedule]:
+    """Schedules for the endpoints polled by the coordinator."""
+    return {
+        # changes around NextInvoiceDate only
+        "budget": EndpointSchedule(
+            base_interval=timedelta(hours=1),
+            max_interval=timedelta(hours=24),
+            invoice_interval=timedelta(minutes=30),
+        ),
+        # changes when invoices are sent and payments arrive
+        "statements": EndpointSchedule(
+            base_interval=timedelta(minutes=30),
+            max_interval=timedelta(hours=6),
+            invoice_interval=timedelta(minutes=15),
+        ),
+        # next to static
+        "contracts": EndpointSchedule(
+            base_interval=timedelta(hours=24),
+            max_interval=timedelta(days=7),
+        ),
+        "meters": EndpointSchedule(
+            base_interval=timedelta(hours=24),
+            max_interval=timedelta(days=7),
+        ),
+        "alerts": EndpointSchedule(
+            base_interval=timedelta(hours=1),
+            max_interval=timedelta(hours=12),
+        ),
+    }
+
+
+class MyLuminusScheduler:
+    """Decides which endpoints are due and when the coordinator wakes up next."""
+
+    def __init__(self, schedules: dict[str, EndpointSchedule] | None = None) -> None:
+        self.schedules = schedules if schedules is not None else default_schedules()
+        self._invoice_dates: list[date] = []
+
+    def set_invoice_dates(self, lines: list[dict]) -> None:
+        """Keep the NextInvoiceDate of all budget lines."""
+        dates = []
+        for line in lines:
+            try:
+                dates.append(date.fromisoformat(line["NextInvoiceDate"]))
+            except (KeyError, TypeError, ValueError):
+                continue
+        self._invoice_dates = dates
+
+    def in_invoice_window(self, now: datetime) -> bool:
+        """Return True when an invoice date is near."""
+        return any(
+            abs((invoice_date - now.date()).days) <= INVOICE_WINDOW_DAYS
+            for invoice_date in self._invoice_dates
+        )
+
+    def due(self, now: datetime) -> set[str]:
+        """Names of the endpoints to fetch now."""
+        return {
+            name for name, schedule in self.schedules.items() if schedule.is_due(now)
+        }
+
+    def make_due(self) -> None:
+        """Fetch all endpoints on the next refresh, intervals are kept."""
+        for schedule in self.schedules.values():
+            schedule.next_due = None
+
+    def record(self, name: str, now: datetime, changed: bool) -> None:
+        """Plan the next fetch of an endpoint that succeeded."""
+        self.schedules[name].record(now, changed, self.in_invoice_window(now))
+
+    def record_failure(self, name: str, now: datetime) -> None:
+        """Plan a retry for an endpoint that failed."""
+        self.schedules[name].record_failure(now)
+
+    def next_wakeup(self, now: datetime) -> timedelta:
+        """Time until the first endpoint becomes due."""
+        if not self.schedules:
+            return MINIMUM_WAKEUP
+        wakeup = min(
+            (schedule.next_due or now) - now for schedule in self.schedules.values()
+        )
+        return max(wakeup, MINIMUM_WAKEUP)
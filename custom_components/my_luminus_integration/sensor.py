@@ -5,11 +5,20 @@ from homeassistant.components.sensor import (
     SensorEntity,
     SensorEntityDescription,
     SensorDeviceClass,
+    SensorStateClass,
 )
+from homeassistant.const import UnitOfEnergy, UnitOfTime
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.entity import EntityCategory
 
 from .const import DOMAIN, LOGGER
-from .coordinator import MyLuminusCoordinator
+from .consumption_store import from_epoch
+from .coordinator import MyLuminusCoordinator, MyLuminusMeterCoordinator
 from .entity import MyLuminusEntity
+from .models import AMOUNT_OPEN, LINE_FIELDS
+from .projection import EXPECTED_SETTLEMENT, PROJECTED_COST
+from .statement_index import INVOICE, PAYMENT
 
 ENTITY_DESCRIPTIONS_LINES = (
     SensorEntityDescription(
@@ -68,32 +77,41 @@ ENTITIES_STATEMENTS = (
         device_class=SensorDeviceClass.MONETARY,
     ),
 )
+ENTITIES_STATEMENT_ENTRIES = {
+    INVOICE: SensorEntityDescription(
+        key="last_invoice",
+        name="LastInvoice",
+        icon="mdi:receipt-text",
+        device_class=SensorDeviceClass.MONETARY,
+    ),
+    PAYMENT: SensorEntityDescription(
+        key="last_payment",
+        name="LastPayment",
+        icon="mdi:cash-check",
+        device_class=SensorDeviceClass.MONETARY,
+    ),
+}
+ENTITIES_PROJECTIONS = (
+    SensorEntityDescription(
+        key="my_luminus",
+        name=PROJECTED_COST,
+        icon="mdi:chart-line",
+        device_class=SensorDeviceClass.MONETARY,
+    ),
+    SensorEntityDescription(
+        key="my_luminus",
+        name=EXPECTED_SETTLEMENT,
+        icon="mdi:scale-balance",
+        device_class=SensorDeviceClass.MONETARY,
+    ),
+)
 
 
 async def async_setup_entry(hass, entry, async_add_devices):
     """Set up the sensor platform."""
     coordinator = hass.data[DOMAIN][entry.entry_id]
-
-    # create sensors for all units found, not just the first one
-    LOGGER.debug("lines found %s", coordinator.lines)
     devices = []
 
-    for line in coordinator.lines:
-        LOGGER.debug("(0)init data for %s", line)
-        for entity_description in ENTITY_DESCRIPTIONS_LINES:
-            # async_add_devices(
-            devices.append(
-                MyLuminusSensor(
-                    coordinator=coordinator,
-                    entity_description=entity_description,
-                    ean=line["Ean"],
-                    line=line,
-                    sensor=entity_description.name.split(".")[0],
-                )
-            )
-            # for entity_description in ENTITY_DESCRIPTIONS_LINES
-            # )
-
     # append statement data
     devices.append(
         MyLuminusStatementSensor(
@@ -101,13 +119,89 @@ async def async_setup_entry(hass, entry, async_add_devices):
             entity_description=ENTITIES_STATEMENTS[0],
         )
     )
+
+    # latest invoice and payment, kept up to date by the statement index
+    if coordinator.statement_index is not None:
+        for kind, entity_description in ENTITIES_STATEMENT_ENTRIES.items():
+            devices.append(
+                MyLuminusStatementEntrySensor(coordinator, entity_description, kind)
+            )
+
     async_add_devices(devices)
 
+    # sensors per EAN and per endpoint follow what the account has, so a new
+    # or removed EAN doesn't need a reload of the config entry
+    line_entities: dict[str, list[MyLuminusSensor]] = {}
+    meter_entities: dict[str, list[MyLuminusEntity]] = {}
+    endpoint_entities: set[str] = set()
+
+    @callback
+    def _async_sync_entities() -> None:
+        """Add entities for new EANs and retire the ones of removed EANs."""
+        new_devices = []
+        retired = []
+
+        # create sensors for all units found, not just the first one
+        eans = {line["Ean"] for line in coordinator.lines}
+        for ean in eans - line_entities.keys():
+            LOGGER.debug("adding sensors for ean %s", ean)
+            line_entities[ean] = [
+                MyLuminusSensor(
+                    coordinator=coordinator,
+                    entity_description=entity_description,
+                    ean=ean,
+                    sensor=entity_description.name.split(".")[0],
+                )
+                for entity_description in ENTITY_DESCRIPTIONS_LINES
+            ]
+            new_devices.extend(line_entities[ean])
+        for ean in line_entities.keys() - eans:
+            retired.extend(line_entities.pop(ean))
+
+        # every meter has its own coordinator, fetching apart from the others
+        meters = coordinator.meter_coordinators
+        for ean in meters.keys() - meter_entities.keys():
+            meter_entities[ean] = [MyLuminusMeterSensor(meters[ean])]
+            # projections need the consumption history of the meter
+            meter_entities[ean].extend(
+                MyLuminusProjectionSensor(coordinator, entity_description, ean)
+                for entity_description in ENTITIES_PROJECTIONS
+            )
+            new_devices.extend(meter_entities[ean])
+        for ean in meter_entities.keys() - meters.keys():
+            retired.extend(meter_entities.pop(ean))
+
+        # request metrics of the endpoints called so far
+        for endpoint in coordinator.client.metrics.endpoints.keys() - endpoint_entities:
+            endpoint_entities.add(endpoint)
+            new_devices.append(MyLuminusEndpointSensor(coordinator, endpoint))
+
+        if new_devices:
+            async_add_devices(new_devices)
+        if retired:
+            _async_retire(hass, retired)
+
+    _async_sync_entities()
+    entry.async_on_unload(coordinator.async_add_listener(_async_sync_entities))
+
+
+@callback
+def _async_retire(hass: HomeAssistant, entities: list[MyLuminusEntity]) -> None:
+    """Remove entities of EANs that are gone, from the registry as well."""
+    registry = er.async_get(hass)
+    for entity in entities:
+        LOGGER.debug("removing sensor %s", entity.entity_id)
+        if entity.registry_entry is not None:
+            # removing the registry entry also removes the entity
+            registry.async_remove(entity.entity_id)
+        else:
+            hass.async_create_task(entity.async_remove())
+
 
 class MyLuminusStatementSensor(MyLuminusEntity, SensorEntity):
     """Sensor class for My Luminus open amount"""
 
-    statements: dict
+    _change_key = AMOUNT_OPEN
 
     def __init__(
         self,
@@ -117,29 +211,55 @@ class MyLuminusStatementSensor(MyLuminusEntity, SensorEntity):
         """Initialize the sensor class."""
         super().__init__(coordinator)
         LOGGER.debug("creating sensor for open amount")
-        self.statements = coordinator.statements
         self.entity_description = entity_description
 
     @property
-    def native_value(self) -> str:
+    def native_value(self) -> float | None:
         """Return the native value of the sensor."""
-        value = self.statements["AmountOpen"]["Value"]
-        LOGGER.debug("parsing amount for sensor open amount %s", value)
-        return float(value)
+        return self.coordinator.snapshot.amount_open
+
+
+class MyLuminusStatementEntrySensor(MyLuminusEntity, SensorEntity):
+    """Sensor class for the latest invoice or payment."""
+
+    def __init__(
+        self,
+        coordinator: MyLuminusCoordinator,
+        entity_description: SensorEntityDescription,
+        kind: str,
+    ) -> None:
+        """Initialize the sensor class."""
+        super().__init__(coordinator)
+        self.kind = kind
+        self._change_key = (None, kind)
+        self.entity_description = entity_description
+        self._attr_unique_id = (
+            coordinator.config_entry.entry_id + "." + entity_description.key
+        )
+
+    @property
+    def native_value(self) -> float | None:
+        """Return the amount of the latest entry."""
+        latest = self.coordinator.latest_statements.get(self.kind)
+        return latest["amount"] if latest else None
+
+    @property
+    def extra_state_attributes(self) -> dict | None:
+        """Return the id and date of the latest entry."""
+        latest = self.coordinator.latest_statements.get(self.kind)
+        if not latest:
+            return None
+        return {"id": latest["id"], "date": latest["date"]}
 
 
 class MyLuminusSensor(MyLuminusEntity, SensorEntity):
     """Sensor class."""
 
-    line = None
-    sensor = str
-
     def __init__(
         self,
         coordinator: MyLuminusCoordinator,
         entity_description: SensorEntityDescription,
         ean: str,
-        line: dict,
         sensor: str,
     ) -> None:
         """Initialize the sensor class."""
@@ -147,8 +267,11 @@ class MyLuminusSensor(MyLuminusEntity, SensorEntity):
 
         # init data
         LOGGER.debug("init data for ean %s and sensor %s", ean, sensor)
-        self.line = line
+        self.ean = ean
         self.sensor = sensor
+        # resolved once, reading the value is a plain attribute lookup
+        self._attribute = LINE_FIELDS[sensor]
+        self._change_key = (ean, sensor)
 
         self.entity_description = entity_description
 
@@ -159,20 +282,106 @@ class MyLuminusSensor(MyLuminusEntity, SensorEntity):
         # self.entity_id = sensor  # + "." + ean
 
     @property
-    def native_value(self) -> str:
+    def native_value(self) -> float | str | None:
         """Return the native value of the sensor."""
+        return self.coordinator.snapshot.value(self.ean, self._attribute)
+
+
+class MyLuminusMeterSensor(MyLuminusEntity, SensorEntity):
+    """Sensor class for the last consumption period of a meter."""
+
+    _attr_device_class = SensorDeviceClass.ENERGY
+    _attr_icon = "mdi:meter-electric"
+    _attr_native_unit_of_measurement = UnitOfEnergy.KILO_WATT_HOUR
+
+    def __init__(self, coordinator: MyLuminusMeterCoordinator) -> None:
+        """Initialize the sensor class."""
+        super().__init__(coordinator)
+        self._attr_unique_id = "my_luminus." + coordinator.ean + ".LastConsumption"
+        self._attr_name = "LastConsumption " + coordinator.energy_type
+
+    @property
+    def native_value(self) -> float | None:
+        """Return the consumption of the most recent period."""
+        last_period = (self.coordinator.data or {}).get("last_period")
+        return last_period[2] if last_period else None
+
+    @property
+    def extra_state_attributes(self) -> dict | None:
+        """Return the bounds of the most recent period."""
+        last_period = (self.coordinator.data or {}).get("last_period")
+        if not last_period:
+            return None
+        return {
+            "ean": self.coordinator.ean,
+            "from": from_epoch(last_period[0]).isoformat(),
+            "until": from_epoch(last_period[1]).isoformat(),
+        }
+
 
-        value = self.line[self.sensor]
-        LOGGER.debug(
-            "Sensor (id, name, value) is %s, %s, %s",
-            self.unique_id,
-            self.name,
-            value,
+class MyLuminusProjectionSensor(MyLuminusEntity, SensorEntity):
+    """Sensor class for the projected cost or settlement of an EAN."""
+
+    def __init__(
+        self,
+        coordinator: MyLuminusCoordinator,
+        entity_description: SensorEntityDescription,
+        ean: str,
+    ) -> None:
+        """Initialize the sensor class."""
+        super().__init__(coordinator)
+        self.ean = ean
+        self._change_key = (ean, entity_description.name)
+        self.entity_description = entity_description
+        self._attr_unique_id = "my_luminus." + ean + "." + entity_description.name
+        self._attr_name = entity_description.name
+
+    @property
+    def native_value(self) -> float | None:
+        """Return the projected cost or the expected settlement."""
+        projection = self.coordinator.projections.projections.get(self.ean)
+        if projection is None:
+            return None
+        if self.entity_description.name == PROJECTED_COST:
+            return projection.projected_cost
+        return projection.expected_settlement
+
+    @property
+    def extra_state_attributes(self) -> dict | None:
+        """Return how the projection was made."""
+        projection = self.coordinator.projections.projections.get(self.ean)
+        if projection is None:
+            return None
+        return {"ean": self.ean, **projection.as_dict()}
+
+
+class MyLuminusEndpointSensor(MyLuminusEntity, SensorEntity):
+    """Diagnostic sensor with the request metrics of one API endpoint."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+    _attr_icon = "mdi:timer-outline"
+    _attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
+    _attr_state_class = SensorStateClass.MEASUREMENT
+
+    def __init__(self, coordinator: MyLuminusCoordinator, endpoint: str) -> None:
+        """Initialize the sensor class."""
+        super().__init__(coordinator)
+        self.endpoint = endpoint
+        self._attr_unique_id = (
+            coordinator.config_entry.entry_id + ".metrics." + endpoint
         )
-        # some values are numeric, check if we can parse those
-        try:
-            value = float(value)
-        except: # noqa: E722
-            LOGGER.debug("non numeric value received, not parsed")
+        self._attr_name = endpoint + " latency"
 
-        return value
+    @property
+    def native_value(self) -> float | None:
+        """Return the mean latency of the endpoint."""
+        latency = self.coordinator.client.metrics.endpoint(self.endpoint).mean_latency
+        if latency is None:
+            return None
+        return round(latency * 1000, 1)
+
+    @property
+    def extra_state_attributes(self) -> dict:
+        """Return the other metrics of the endpoint."""
+        return self.coordinator.client.metrics.endpoint(self.endpoint).as_dict()
@@ -0,0 +1,143 @@
+"""On disk index of invoices and payments from GetAccountStatement."""
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+
+INVOICE = "invoice"
+PAYMENT = "payment"
+
+# candidate keys, the first one present in an entry is used
+ID_KEYS = {
+    INVOICE: ("InvoiceNumber", "InvoiceId", "Id"),
+    PAYMENT: ("PaymentId", "PaymentReference", "Id"),
+}
+DATE_KEYS = {
+    INVOICE: ("InvoiceDate", "Date", "DueDate"),
+    PAYMENT: ("PaymentDate", "Date"),
+}
+
+# sqlite limits the number of parameters in a query
+_CHUNK = 500
+
+
+def _first(entry: dict, keys: tuple[str, ...]) -> any:
+    for key in keys:
+        if entry.get(key) is not None:
+            return entry[key]
+    return None
+
+
+def _amount(entry: dict) -> float | None:
+    amount = entry.get("Amount")
+    if isinstance(amount, dict):
+        amount = amount.get("Value")
+    try:
+        return float(amount)
+    except (TypeError, ValueError):
+        return None
+
+
+class MyLuminusStatementIndex:
+    """Invoices and payments keyed by ID, with a digest to spot changes.
+
+    Only the digest, date and amount of each entry are kept, on disk. All
+    methods do blocking IO, run them in the executor.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._lock = threading.Lock()
+        self._connection: sqlite3.Connection | None = None
+
+    def open(self) -> None:
+        """Open the database and create the table when needed."""
+        self._connection = sqlite3.connect(self._path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS statement_entry (
+                    kind TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    digest TEXT NOT NULL,
+                    date TEXT,
+                    amount REAL,
+                    PRIMARY KEY (kind, id)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS statement_entry_date
+                    ON statement_entry (kind, date);
+                """
+            )
+
+    def close(self) -> None:
+        """Close the database."""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def update(self, kind: str, entries: list[dict]) -> tuple[list[dict], bool]:
+        """Store new or changed entries and return them.
+
+        The flag tells if the index was empty for this kind before, so a first
+        import can be told apart from news.
+        """
+        keyed = {}
+        for entry in entries:
+            encoded = json.dumps(entry, sort_keys=True, separators=(",", ":"))
+            digest = hashlib.blake2b(encoded.encode(), digest_size=16).hexdigest()
+            entry_id = _first(entry, ID_KEYS[kind])
+            keyed[str(entry_id) if entry_id is not None else digest] = (digest, entry)
+
+        with self._lock:
+            initial = (
+                self._connection.execute(
+                    "SELECT 1 FROM statement_entry WHERE kind = ? LIMIT 1", (kind,)
+                ).fetchone()
+                is None
+            )
+            known = {}
+            ids = list(keyed)
+            for index in range(0, len(ids), _CHUNK):
+                chunk = ids[index : index + _CHUNK]
+                known.update(
+                    self._connection.execute(
+                        "SELECT id, digest FROM statement_entry WHERE kind = ?"
+                        f" AND id IN ({','.join('?' * len(chunk))})",
+                        (kind, *chunk),
+                    ).fetchall()
+                )
+
+            changed = [
+                (entry_id, digest, entry)
+                for entry_id, (digest, entry) in keyed.items()
+                if known.get(entry_id) != digest
+            ]
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO statement_entry VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (
+                            kind,
+                            entry_id,
+                            digest,
+                            _first(entry, DATE_KEYS[kind]),
+                            _amount(entry),
+                        )
+                        for entry_id, digest, entry in changed
+                    ],
+                )
+        return [entry for _, _, entry in changed], initial
+
+    def latest(self, kind: str) -> dict | None:
+        """Most recent entry of a kind, by date."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT id, date, amount FROM statement_entry WHERE kind = ?"
+                " ORDER BY date DESC LIMIT 1",
+                (kind,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {"id": row[0], "date": row[1], "amount": row[2]}
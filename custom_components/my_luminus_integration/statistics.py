@@ -0,0 +1,134 @@
+"""Consumption history imported as hourly long term statistics."""
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime, timezone
+
+import numpy as np
+from homeassistant.components.recorder import get_instance
+from homeassistant.components.recorder.models import StatisticData, StatisticMetaData
+from homeassistant.components.recorder.statistics import (
+    async_add_external_statistics,
+    get_last_statistics,
+)
+from homeassistant.const import UnitOfEnergy
+from homeassistant.core import HomeAssistant
+from homeassistant.util import dt as dt_util
+
+from .const import DOMAIN, LOGGER, STATISTICS_BATCH_SIZE
+from .consumption_store import from_epoch, to_epoch
+from .timeseries import MyLuminusTimeSeries
+
+HOUR = 3600
+
+
+def statistic_id(ean: str, energy_type: str) -> str:
+    """External statistic of the consumption of a meter."""
+    return f"{DOMAIN}:{ean}_{energy_type.lower()}_consumption"
+
+
+def hourly(
+    start: np.ndarray, records: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Sum sorted periods into the hours they start in.
+
+    Returns the hour starts, the consumption per hour and the running total
+    at the end of each hour. Daily or monthly periods land in their first
+    hour, so totals per day or month stay right without inventing a profile.
+    """
+    hours = start - start % HOUR
+    first = np.flatnonzero(np.r_[True, hours[1:] != hours[:-1]])
+    last = np.r_[first[1:], len(hours)] - 1
+    return (
+        hours[first],
+        np.add.reduceat(records["value"], first),
+        records["cumulative"][last],
+    )
+
+
+def _wall_clock(value: datetime | float) -> int:
+    """Stored seconds of a statistics start, older cores hand out datetimes."""
+    if not isinstance(value, datetime):
+        value = datetime.fromtimestamp(value, tz=timezone.utc)
+    return to_epoch(dt_util.as_local(value).replace(tzinfo=None).isoformat())
+
+
+class MyLuminusStatisticsImporter:
+    """Imports the series of meters as external statistics, in batches.
+
+    Every import continues from the last imported hour, which is imported
+    again since its periods might have been incomplete. Running sums are the
+    running totals of the series. When those no longer match what was
+    imported, like after older history was backfilled, everything is
+    imported again.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._hass = hass
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    async def async_import(
+        self, series: MyLuminusTimeSeries, ean: str, energy_type: str
+    ) -> int:
+        """Import new hours of a series, return the number of hours imported."""
+        if "recorder" not in self._hass.config.components or not len(series):
+            return 0
+        statistic = statistic_id(ean, energy_type)
+        lock = self._locks.setdefault(statistic, asyncio.Lock())
+        async with lock:
+            return await self._async_import(series, statistic, ean, energy_type)
+
+    async def _async_import(
+        self,
+        series: MyLuminusTimeSeries,
+        statistic: str,
+        ean: str,
+        energy_type: str,
+    ) -> int:
+        last = await get_instance(self._hass).async_add_executor_job(
+            get_last_statistics, self._hass, 1, statistic, True, {"state", "sum"}
+        )
+        # one snapshot, the executor may map a longer series between reads
+        start, records = series.arrays
+        position = 0
+        if last.get(statistic):
+            row = last[statistic][0]
+            position = int(np.searchsorted(start, _wall_clock(row["start"])))
+            cumulative, _covered = series.running_totals(position, records)
+            if not np.isclose(cumulative, (row["sum"] or 0) - (row["state"] or 0)):
+                LOGGER.debug("history of %s changed, importing all of it", statistic)
+                position = 0
+
+        if position == len(start):
+            return 0
+        hours, values, sums = hourly(start[position:], records[position:])
+        metadata = StatisticMetaData(
+            has_mean=False,
+            has_sum=True,
+            name=f"My Luminus {energy_type} {ean}",
+            source=DOMAIN,
+            statistic_id=statistic,
+            unit_of_measurement=UnitOfEnergy.KILO_WATT_HOUR,
+        )
+        for batch in range(0, len(hours), STATISTICS_BATCH_SIZE):
+            window = slice(batch, batch + STATISTICS_BATCH_SIZE)
+            async_add_external_statistics(
+                self._hass,
+                metadata,
+                [
+                    StatisticData(
+                        start=from_epoch(hour).replace(
+                            tzinfo=dt_util.DEFAULT_TIME_ZONE
+                        ),
+                        state=value,
+                        sum=total,
+                    )
+                    for hour, value, total in zip(
+                        hours[window].tolist(),
+                        values[window].tolist(),
+                        sums[window].tolist(),
+                    )
+                ],
+            )
+        LOGGER.debug("imported %s hours of %s", len(hours), statistic)
+        return len(hours)
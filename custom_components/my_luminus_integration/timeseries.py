@@ -0,0 +1,232 @@
+"""Memory mapped consumption series, fixed width records with a timestamp index."""
+from __future__ import annotations
+
+import os
+import threading
+
+import numpy as np
+
+# period starts, seconds since epoch of the wall clock time like the store
+INDEX = np.dtype("<i8")
+# the rest of a period, with running totals up to and including it
+RECORD = np.dtype(
+    [
+        ("end", "<i8"),
+        ("value", "<f8"),
+        ("cumulative", "<f8"),
+        ("covered", "<i8"),
+    ]
+)
+
+
+def _empty() -> tuple[np.ndarray, np.ndarray]:
+    return np.empty(0, dtype=INDEX), np.empty(0, dtype=RECORD)
+
+
+class MyLuminusSeriesClosedError(Exception):
+    """Exception to indicate a series was written to while not open."""
+
+
+class MyLuminusTimeSeries:
+    """Consumption periods of one meter, energy type and periodicity.
+
+    Period starts are kept sorted in a .idx file, the other fields in a .dat
+    file of fixed width records at the same positions. Both are memory mapped
+    read only, so a date range is a view on the mapped pages found with a
+    binary search over the index, nothing is loaded that isn't touched.
+    Records carry the running consumption and seconds covered, so the total
+    of a range takes two lookups.
+
+    extend and open do blocking IO, run them in the executor. They swap in
+    new mappings while the event loop reads, so readers that need both the
+    starts and the records take them together from arrays.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._index_path = path + ".idx"
+        self._data_path = path + ".dat"
+        self._lock = threading.Lock()
+        # starts and records, replaced together so they always match
+        self.arrays: tuple[np.ndarray, np.ndarray] = _empty()
+        self.closed = True
+        # bumped on every change, results computed for older versions are stale
+        self.version = 0
+
+    def __len__(self) -> int:
+        return len(self.arrays[0])
+
+    @property
+    def start(self) -> np.ndarray:
+        """Period starts, sorted."""
+        return self.arrays[0]
+
+    @property
+    def records(self) -> np.ndarray:
+        """Records at the same positions as the starts."""
+        return self.arrays[1]
+
+    def open(self) -> None:
+        """Map the files, creating them when needed."""
+        with self._lock:
+            for path in (self._index_path, self._data_path):
+                with open(path, "ab"):
+                    pass
+            count = min(
+                os.path.getsize(self._index_path) // INDEX.itemsize,
+                os.path.getsize(self._data_path) // RECORD.itemsize,
+            )
+            # a write cut short leaves a partial or unmatched tail behind
+            os.truncate(self._index_path, count * INDEX.itemsize)
+            os.truncate(self._data_path, count * RECORD.itemsize)
+            self._map(count)
+            self.closed = False
+
+    def close(self) -> None:
+        """Drop the mappings, writing is refused until opened again."""
+        with self._lock:
+            self.closed = True
+            self._map(0)
+
+    def _map(self, count: int) -> None:
+        if not count:
+            # an empty file can't be mapped
+            self.arrays = _empty()
+            return
+        self.arrays = (
+            np.memmap(self._index_path, INDEX, "r", shape=(count,)),
+            np.memmap(self._data_path, RECORD, "r", shape=(count,)),
+        )
+
+    def extend(self, rows: list[tuple[int, int, float]]) -> int:
+        """Add (start, end, value) rows, replacing stored periods with the same start.
+
+        New periods are appended. Periods older than the last one stored, like
+        backfilled history, rewrite the files from the oldest of them onwards.
+        Files never shrink, so views handed out before stay valid.
+        """
+        if not rows:
+            return 0
+        block = np.asarray(rows, dtype=np.float64)
+        start = block[:, 0].astype(INDEX)
+        # later rows win, np.unique keeps the first so look at them reversed
+        start, index = np.unique(start[::-1], return_index=True)
+        index = len(block) - 1 - index
+        end = block[index, 1].astype(np.int64)
+        value = block[index, 2]
+
+        with self._lock:
+            if self.closed:
+                # the mappings are gone, we'd write over the start of the files
+                raise MyLuminusSeriesClosedError(f"{self._data_path} is closed")
+            stored_start, stored = self.arrays
+            first = int(np.searchsorted(stored_start, start[0]))
+            # only the tail from the first new period is read and rewritten
+            tail_start = np.array(stored_start[first:])
+            tail = np.array(stored[first:])
+            keep = ~np.isin(tail_start, start)
+            start = np.concatenate((tail_start[keep], start))
+            order = np.argsort(start, kind="stable")
+            start = start[order]
+            end = np.concatenate((tail["end"][keep], end))[order]
+            value = np.concatenate((tail["value"][keep], value))[order]
+
+            records = np.empty(len(start), dtype=RECORD)
+            records["end"] = end
+            records["value"] = value
+            cumulative, covered = self.running_totals(first, stored)
+            records["cumulative"] = cumulative + np.cumsum(value)
+            records["covered"] = covered + np.cumsum(end - start)
+
+            # records first, an index entry without its record is cut at open
+            for path, array, itemsize in (
+                (self._data_path, records, RECORD.itemsize),
+                (self._index_path, start, INDEX.itemsize),
+            ):
+                with open(path, "r+b") as file:
+                    file.seek(first * itemsize)
+                    file.write(array.tobytes())
+            self._map(first + len(start))
+            self.version += 1
+        return len(index)
+
+    def running_totals(
+        self, position: int, records: np.ndarray | None = None
+    ) -> tuple[float, int]:
+        """Consumption and seconds covered of all periods before position.
+
+        Pass the records the position was found for, when it was.
+        """
+        if position == 0:
+            return 0.0, 0
+        if records is None:
+            records = self.records
+        record = records[position - 1]
+        return float(record["cumulative"]), int(record["covered"])
+
+    def range(self, date_from: int, date_until: int) -> tuple[np.ndarray, np.ndarray]:
+        """Starts and records of the periods starting in [from, until), as views."""
+        start, records = self.arrays
+        first, last = np.searchsorted(start, (date_from, date_until))
+        return start[first:last], records[first:last]
+
+    def last(self) -> tuple[int, int, float] | None:
+        """Return (start, end, value) of the most recent period."""
+        start, records = self.arrays
+        if not len(start):
+            return None
+        record = records[-1]
+        return int(start[-1]), int(record["end"]), float(record["value"])
+
+    def totals(self, bounds: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Consumption and seconds covered of periods starting in [from, until).
+
+        bounds holds (from, until) pairs as rows, all are answered with a
+        single binary search.
+        """
+        start, records = self.arrays
+        index = np.searchsorted(start, bounds)
+        if not len(start):
+            zeros = np.zeros(len(bounds))
+            return zeros, zeros
+        # running totals before index, the record just before it holds them
+        before = np.maximum(index - 1, 0)
+        cumulative = np.where(index > 0, records["cumulative"][before], 0.0)
+        covered = np.where(index > 0, records["covered"][before], 0)
+        return (
+            cumulative[:, 1] - cumulative[:, 0],
+            covered[:, 1] - covered[:, 0],
+        )
+
+
+class MyLuminusSeriesStore:
+    """The series of all meters of an account, as files in one directory.
+
+    All methods do blocking IO, run them in the executor.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self._directory = directory
+        self._lock = threading.Lock()
+        self._series: dict[tuple[str, str, str], MyLuminusTimeSeries] = {}
+
+    def get(
+        self, ean: str, energy_type: str, periodicity: str
+    ) -> tuple[MyLuminusTimeSeries, bool]:
+        """Return the opened series and whether its files were just created."""
+        key = (ean, energy_type, periodicity)
+        with self._lock:
+            if key in self._series:
+                return self._series[key], False
+            os.makedirs(self._directory, exist_ok=True)
+            path = os.path.join(self._directory, ".".join(key))
+            created = not os.path.exists(path + ".idx")
+            series = self._series[key] = MyLuminusTimeSeries(path)
+            series.open()
+            return series, created
+
+    def close(self) -> None:
+        """Close all series."""
+        with self._lock:
+            for series in self._series.values():
+                series.close()
+            self._series.clear()
@@ -0,0 +1,280 @@
+"""Transports carrying the requests of MyLuminusApiClient.
+
+The aiohttp transport talks to the backend. The recording transport wraps it
+and keeps every exchange with its timing, tokens and EANs redacted, and the
+replay transport serves a recording back without credentials or network.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from collections.abc import Mapping
+from dataclasses import dataclass
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import aiohttp
+
+from .const import MAX_RESPONSE_BYTES
+
+RECORDING_VERSION = 1
+REDACTED = "**REDACTED**"
+# values of these keys never end up in a recording
+SECRET_KEYS = frozenset({"access_token", "refresh_token", "id_token", "password"})
+# headers the client looks at, others aren't recorded
+RECORDED_HEADERS = ("Content-Type", "Retry-After")
+# query parameters that differ between runs, replays match on the others
+VOLATILE_PARAMS = frozenset({"dateFrom", "dateUntil"})
+
+ERROR_TIMEOUT = "timeout"
+ERROR_CONNECTION = "connection"
+
+
+class MyLuminusResponseTooLargeError(Exception):
+    """Exception to indicate a response body over the size limit."""
+
+
+@dataclass(slots=True)
+class TransportResponse:
+    """Status, headers and raw body of a response."""
+
+    status: int
+    headers: Mapping[str, str]
+    body: bytes
+
+
+class MyLuminusTransport(ABC):
+    """Sends one request and returns the response, without interpreting it."""
+
+    @abstractmethod
+    async def async_request(
+        self,
+        method: str,
+        url: str,
+        headers: dict | None = None,
+        data: str | None = None,
+        json: dict | None = None,  # pylint: disable=redefined-outer-name
+    ) -> TransportResponse:
+        """Send a request."""
+
+
+class MyLuminusAiohttpTransport(MyLuminusTransport):
+    """Requests over an aiohttp session."""
+
+    def __init__(
+        self, session: aiohttp.ClientSession, max_bytes: int = MAX_RESPONSE_BYTES
+    ) -> None:
+        self._session = session
+        self._max_bytes = max_bytes
+
+    async def async_request(
+        self,
+        method: str,
+        url: str,
+        headers: dict | None = None,
+        data: str | None = None,
+        json: dict | None = None,  # pylint: disable=redefined-outer-name
+    ) -> TransportResponse:
+        """Send a request, only reading the body of successful responses."""
+        async with self._session.request(
+            method=method, url=url, headers=headers, data=data, json=json
+        ) as response:
+            body = b""
+            # posting readings doesn't always come with a body
+            if response.status < 400 and response.status != 204:
+                body = await self._read_body(response)
+            return TransportResponse(response.status, response.headers, body)
+
+    async def _read_body(self, response: aiohttp.ClientResponse) -> bytes:
+        """Read a response body, refusing anything over the size limit."""
+        if (response.content_length or 0) > self._max_bytes:
+            raise MyLuminusResponseTooLargeError
+        body = bytearray()
+        async for chunk in response.content.iter_chunked(65536):
+            body += chunk
+            if len(body) > self._max_bytes:
+                raise MyLuminusResponseTooLargeError
+        return bytes(body)
+
+
+class _Redactor:
+    """Replaces secrets, and EANs by stable pseudonyms of the same shape."""
+
+    def __init__(self) -> None:
+        self._eans: dict[str, str] = {}
+
+    def ean(self, ean: str) -> str:
+        if ean not in self._eans:
+            self._eans[ean] = f"54{len(self._eans) + 1:016d}"
+        return self._eans[ean]
+
+    def value(self, value: any, key: str | None = None) -> any:
+        if isinstance(value, dict):
+            return {name: self.value(item, name) for name, item in value.items()}
+        if isinstance(value, list):
+            return [self.value(item) for item in value]
+        if key is not None and key.lower() in SECRET_KEYS:
+            return REDACTED
+        if isinstance(value, str) and (
+            (key is not None and key.lower() == "ean") or value in self._eans
+        ):
+            return self.ean(value)
+        return value
+
+    def url(self, url: str) -> str:
+        """Path and query of a url, the host isn't kept."""
+        parts = urlsplit(url)
+        if not parts.query:
+            return parts.path
+        query = [
+            (name, self.ean(value) if name.lower() == "ean" else value)
+            for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        ]
+        return parts.path + "?" + urlencode(query)
+
+    def body(self, body: bytes) -> str:
+        if not body:
+            return ""
+        try:
+            decoded = json.loads(body)
+        except ValueError:
+            # we only know how to clean json, anything else is dropped
+            return REDACTED
+        return json.dumps(self.value(decoded), separators=(",", ":"))
+
+
+def _match_key(method: str, url: str) -> tuple:
+    """What a replayed request is matched on."""
+    parts = urlsplit(url)
+    query = tuple(
+        sorted(
+            (name, value)
+            for name, value in parse_qsl(parts.query, keep_blank_values=True)
+            if name not in VOLATILE_PARAMS
+        )
+    )
+    return method, parts.path, query
+
+
+class MyLuminusRecordingTransport(MyLuminusTransport):
+    """Passes requests on and keeps the exchanges for async_save.
+
+    Request bodies of the login aren't kept at all, response bodies only
+    when they are json. Secrets are redacted and every EAN is replaced by
+    the same pseudonym throughout the recording, so it still replays.
+    """
+
+    def __init__(self, transport: MyLuminusTransport, path: str) -> None:
+        self._transport = transport
+        self._path = path
+        self._redactor = _Redactor()
+        self._started = time.monotonic()
+        self.exchanges: list[dict] = []
+
+    async def async_request(
+        self,
+        method: str,
+        url: str,
+        headers: dict | None = None,
+        data: str | None = None,
+        json: dict | None = None,  # pylint: disable=redefined-outer-name
+    ) -> TransportResponse:
+        """Send a request through the wrapped transport and record it."""
+        start = time.monotonic()
+        exchange = {
+            "offset": round(start - self._started, 4),
+            "method": method,
+            "url": self._redactor.url(url),
+        }
+        if json is not None:
+            exchange["request"] = self._redactor.value(json)
+        try:
+            response = await self._transport.async_request(
+                method, url, headers=headers, data=data, json=json
+            )
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            # the client's timeout cancels the request
+            exchange["error"] = ERROR_TIMEOUT
+            raise
+        except aiohttp.ClientError:
+            exchange["error"] = ERROR_CONNECTION
+            raise
+        else:
+            exchange["status"] = response.status
+            exchange["headers"] = {
+                name: response.headers[name]
+                for name in RECORDED_HEADERS
+                if name in response.headers
+            }
+            exchange["size"] = len(response.body)
+            exchange["body"] = self._redactor.body(response.body)
+            return response
+        finally:
+            exchange["duration"] = round(time.monotonic() - start, 4)
+            self.exchanges.append(exchange)
+
+    async def async_save(self) -> None:
+        """Write the exchanges recorded so far."""
+        recording = {"version": RECORDING_VERSION, "exchanges": list(self.exchanges)}
+
+        def _write() -> None:
+            with open(self._path, "w", encoding="utf-8") as file:
+                json.dump(recording, file, indent=1)
+
+        await asyncio.get_running_loop().run_in_executor(None, _write)
+
+
+class MyLuminusReplayTransport(MyLuminusTransport):
+    """Serves the exchanges of a recording back, in recorded order per request.
+
+    Requests are matched on method, path and query without the dates, and
+    cycle through the recorded answers. With a speed every answer takes its
+    recorded duration divided by the speed, without one they're immediate.
+    """
+
+    def __init__(self, exchanges: list[dict], speed: float | None = 1.0) -> None:
+        self._speed = speed
+        self._exchanges: dict[tuple, list[dict]] = defaultdict(list)
+        for exchange in exchanges:
+            self._exchanges[_match_key(exchange["method"], exchange["url"])].append(
+                exchange
+            )
+        self._served: dict[tuple, int] = defaultdict(int)
+        self.requests = 0
+
+    @classmethod
+    def load(cls, path: str, speed: float | None = 1.0) -> MyLuminusReplayTransport:
+        """Read a recording, this does blocking IO."""
+        with open(path, encoding="utf-8") as file:
+            recording = json.load(file)
+        if recording.get("version") != RECORDING_VERSION:
+            raise ValueError(f"Unsupported recording version in {path}")
+        return cls(recording["exchanges"], speed)
+
+    async def async_request(
+        self,
+        method: str,
+        url: str,
+        headers: dict | None = None,
+        data: str | None = None,
+        json: dict | None = None,  # pylint: disable=redefined-outer-name
+    ) -> TransportResponse:
+        """Answer with the next recorded exchange for this request."""
+        self.requests += 1
+        key = _match_key(method, url)
+        candidates = self._exchanges.get(key)
+        if not candidates:
+            return TransportResponse(404, {}, b"")
+        exchange = candidates[self._served[key] % len(candidates)]
+        self._served[key] += 1
+        if self._speed:
+            await asyncio.sleep(exchange["duration"] / self._speed)
+        if exchange.get("error") == ERROR_TIMEOUT:
+            raise asyncio.TimeoutError
+        if exchange.get("error") == ERROR_CONNECTION:
+            raise aiohttp.ClientConnectionError("Replayed connection error")
+        return TransportResponse(
+            exchange["status"], exchange["headers"], exchange["body"].encode()
+        )
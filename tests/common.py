@@ -0,0 +1,13 @@
+"""Helpers shared by the tests."""
+from homeassistant.core import HomeAssistant
+
+
+async def async_hass(config_dir: str) -> HomeAssistant:
+    """Bare Home Assistant instance, not started, created in the running loop."""
+    try:
+        hass = HomeAssistant(config_dir)
+    except TypeError:
+        # older cores take no arguments
+        hass = HomeAssistant()
+        hass.config.config_dir = config_dir
+    return hass
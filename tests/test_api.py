@@ -0,0 +1,94 @@
+"""Tests for the API client."""
+import asyncio
+import json
+
+from custom_components.my_luminus_integration.api import MyLuminusApiClient
+from custom_components.my_luminus_integration.cache import (
+    CachePolicy,
+    MyLuminusResponseCache,
+)
+from custom_components.my_luminus_integration.metrics import RECENT_LATENCIES
+from custom_components.my_luminus_integration.transport import (
+    MyLuminusTransport,
+    TransportResponse,
+)
+
+
+class FakeTransport(MyLuminusTransport):
+    """Answers with the next body, repeating the last one."""
+
+    def __init__(self, bodies: list[dict]) -> None:
+        self.bodies = bodies
+        self.requests = 0
+
+    async def async_request(self, method, url, headers=None, data=None, json=None):
+        body = self.bodies[min(self.requests, len(self.bodies) - 1)]
+        self.requests += 1
+        return TransportResponse(200, {}, _encode(body))
+
+
+def _encode(body: dict) -> bytes:
+    return json.dumps(body).encode()
+
+
+def _contracts(product: str) -> dict:
+    return {"Contracts": [{"Ean": "5414488200000000", "Product": product}]}
+
+
+def test_expired_response_is_served_and_refreshed(tmp_path):
+    """Listeners hear of a refreshed response only when it changed."""
+
+    async def _async_test() -> None:
+        transport = FakeTransport([_contracts("Fixed"), _contracts("Variable")])
+        client = MyLuminusApiClient(
+            "user",
+            "password",
+            None,
+            transport=transport,
+            # everything expires at once
+            cache=MyLuminusResponseCache({"GetContracts": CachePolicy(ttl=0)}),
+        )
+        client.result_ttl = 0
+        revalidated = []
+        client.async_listen_revalidated(revalidated.append)
+
+        first = await client.contracts("token")
+        # the expired copy is answered at once and refreshed in the background
+        assert await client.contracts("token") == first
+        await asyncio.gather(*client._revalidating.values())
+        assert revalidated == ["GetContracts"]
+
+        assert await client.contracts("token") == _contracts("Variable")
+        await asyncio.gather(*client._revalidating.values())
+        assert revalidated == ["GetContracts"]
+        assert transport.requests == 3
+
+        # without stale copies the refresh comes first
+        assert await client.contracts("token", allow_stale=False) == _contracts(
+            "Variable"
+        )
+        assert transport.requests == 4
+
+    asyncio.run(_async_test())
+
+
+def test_hedge_delay_recovers_after_an_outage():
+    """Failed requests don't count, and slow ones are forgotten."""
+    client = MyLuminusApiClient("user", "password", None, transport=FakeTransport([]))
+    metrics = client.metrics.endpoint("GetContracts")
+    for _ in range(RECENT_LATENCIES):
+        metrics.record_latency(0.2)
+    assert client._hedge_delay("GetContracts") == 0.2
+
+    # timeouts and errors of an outage
+    for _ in range(50):
+        metrics.record_latency(10.0, success=False)
+    assert client._hedge_delay("GetContracts") == 0.2
+
+    # slow answers turn hedging off, until fast ones push them out
+    for _ in range(RECENT_LATENCIES):
+        metrics.record_latency(12.0)
+    assert client._hedge_delay("GetContracts") is None
+    for _ in range(RECENT_LATENCIES):
+        metrics.record_latency(0.3)
+    assert client._hedge_delay("GetContracts") == 0.3
@@ -0,0 +1,66 @@
+"""Tests for the background backfill."""
+import asyncio
+
+from custom_components.my_luminus_integration import backfill
+from custom_components.my_luminus_integration.const import CONSUMPTION_PERIODICITY
+from custom_components.my_luminus_integration.consumption_store import (
+    MyLuminusConsumptionStore,
+)
+from custom_components.my_luminus_integration.coordinator import (
+    MyLuminusCoordinator,
+    MyLuminusMeterCoordinator,
+)
+
+from .common import async_hass
+
+EAN = "5414488200000000"
+
+
+class FakeClient:
+    """Answers the first window with nothing and fails the second."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def async_listen_revalidated(self, listener):
+        return lambda: None
+
+    async def async_get_access_token(self) -> str:
+        return "token"
+
+    async def consumptions(self, token: str, **kwargs) -> dict | None:
+        self.calls += 1
+        if self.calls == 1:
+            return None
+        if self.calls == 2:
+            raise RuntimeError("unexpected answer")
+        return {"Consumptions": []}
+
+
+def test_bad_windows_dont_stop_the_others(tmp_path, monkeypatch):
+    """Windows after an empty or failed one are still checkpointed."""
+    monkeypatch.setattr(backfill, "BACKFILL_PAUSE", 0)
+
+    async def _async_test() -> None:
+        hass = await async_hass(str(tmp_path))
+        store = MyLuminusConsumptionStore(str(tmp_path / "consumption.db"))
+        store.open()
+        client = FakeClient()
+        coordinator = MyLuminusCoordinator(
+            hass=hass, client=client, consumption_store=store
+        )
+        meter = MyLuminusMeterCoordinator(
+            coordinator, {"Ean": EAN, "EnergyType": "Electricity"}
+        )
+        runner = backfill.MyLuminusBackfill(hass, coordinator, days=120)
+
+        await runner.async_run(meter)
+
+        completed = store.completed_windows(EAN, "Electricity", CONSUMPTION_PERIODICITY)
+        assert client.calls >= 4
+        assert len(completed) == client.calls - 2
+        await coordinator.async_stop_refreshes()
+        store.close()
+        await hass.async_stop(force=True)
+
+    asyncio.run(_async_test())
@@ -0,0 +1,114 @@
+"""Tests for the coordinators."""
+import asyncio
+from collections.abc import Callable
+
+from custom_components.my_luminus_integration import backfill
+from custom_components.my_luminus_integration.consumption_store import (
+    MyLuminusConsumptionStore,
+)
+from custom_components.my_luminus_integration.coordinator import MyLuminusCoordinator
+from custom_components.my_luminus_integration.resilience import (
+    deadline,
+    remaining_budget,
+)
+
+from .common import async_hass
+
+EAN = "5414488200000000"
+METERS = {"Meters": [{"Ean": EAN, "EnergyType": "Electricity"}]}
+
+
+class FakeClient:
+    """Answers at once, keeping the budget each call was made with."""
+
+    def __init__(self) -> None:
+        self.budgets: dict[str, list[float | None]] = {}
+        # meter fetches wait for this, to keep a refresh running
+        self.answer = asyncio.Event()
+        self.answer.set()
+
+    def _record(self, endpoint: str) -> None:
+        self.budgets.setdefault(endpoint, []).append(remaining_budget())
+
+    def async_listen_revalidated(self, listener) -> Callable[[], None]:
+        return lambda: None
+
+    async def async_get_access_token(self) -> str:
+        return "token"
+
+    async def metrics_range(self, token: str, **kwargs) -> dict:
+        self._record("metrics_range")
+        await self.answer.wait()
+        return {}
+
+    async def consumptions(self, token: str, **kwargs) -> dict:
+        self._record("consumptions")
+        return {"Consumptions": []}
+
+
+def test_meters_added_by_a_cycle_get_their_own_budget(tmp_path, monkeypatch):
+    """Refreshes and backfills started within a cycle outlive its budget."""
+    monkeypatch.setattr(backfill, "BACKFILL_PAUSE", 0)
+
+    async def _async_test() -> None:
+        hass = await async_hass(str(tmp_path))
+        store = MyLuminusConsumptionStore(str(tmp_path / "consumption.db"))
+        store.open()
+        client = FakeClient()
+        coordinator = MyLuminusCoordinator(
+            hass=hass, client=client, consumption_store=store
+        )
+        coordinator.backfill = backfill.MyLuminusBackfill(hass, coordinator, days=31)
+        coordinator.backfill.async_start()
+
+        with deadline(0.01):
+            # the cycle used up its budget by the time the meters came in
+            await asyncio.sleep(0.02)
+            assert remaining_budget() == 0
+            coordinator._async_update_meter_coordinators(METERS)
+        await hass.async_block_till_done()
+
+        assert client.budgets["metrics_range"][0] > 60
+        # the meter syncs within a budget of its own, the backfill has none
+        budgets = client.budgets["consumptions"]
+        assert None in budgets
+        assert all(budget is None or budget > 60 for budget in budgets)
+
+        # later refreshes run from a timer set up in that context as well
+        meter = coordinator.meter_coordinators[EAN]
+        with deadline(0):
+            await meter.async_refresh()
+        assert client.budgets["metrics_range"][-1] > 60
+
+        await coordinator.async_stop_refreshes()
+        store.close()
+        await hass.async_stop(force=True)
+
+    asyncio.run(_async_test())
+
+
+def test_shutdown_waits_for_removed_meters(tmp_path):
+    """A meter removed while refreshing is stopped and waited for."""
+
+    async def _async_test() -> None:
+        hass = await async_hass(str(tmp_path))
+        client = FakeClient()
+        coordinator = MyLuminusCoordinator(hass=hass, client=client)
+        client.answer.clear()
+        coordinator._async_update_meter_coordinators(METERS)
+        meter = coordinator.meter_coordinators[EAN]
+        await asyncio.sleep(0)
+        assert not meter.idle.is_set()
+
+        coordinator._async_update_meter_coordinators({"Meters": []})
+        assert meter.closing
+        shutdown = asyncio.ensure_future(coordinator.async_stop_refreshes())
+        await asyncio.sleep(0)
+        assert not shutdown.done()
+
+        client.answer.set()
+        await shutdown
+        assert meter.idle.is_set()
+        await hass.async_stop(force=True)
+
+    asyncio.run(_async_test())
@@ -0,0 +1,102 @@
+"""Tests for the queue of meter readings."""
+import asyncio
+from datetime import date
+
+from custom_components.my_luminus_integration.api import MyLuminusApiClientError
+from custom_components.my_luminus_integration.outbox import MyLuminusOutbox
+
+from .common import async_hass
+
+EAN = "5414488200000000"
+DAY = date(2023, 8, 14)
+
+
+class FakeClient:
+    """Accepts one reading per EAN and day, like the API."""
+
+    def __init__(self) -> None:
+        self.calls: list[tuple] = []
+        self.readings: dict[tuple[str, str], dict] = {}
+        # inserts wait for this, to queue readings while one is submitted
+        self.answer = asyncio.Event()
+        self.answer.set()
+        # number of inserts to fail
+        self.failures = 0
+
+    async def async_get_access_token(self) -> str:
+        return "token"
+
+    async def insert_meter_reading(self, token: str, reading: dict) -> None:
+        self.calls.append(("insert", reading["Value"]))
+        await self.answer.wait()
+        if self.failures:
+            self.failures -= 1
+            raise MyLuminusApiClientError("Server error 503")
+        key = (reading["Ean"], reading["Date"])
+        if key in self.readings:
+            raise MyLuminusApiClientError("One reading per day")
+        self.readings[key] = reading
+
+    async def delete_meter_reading(self, token: str, ean: str, date: str) -> None:
+        self.calls.append(("delete", date))
+        self.readings.pop((ean, date), None)
+
+
+def test_reading_queued_while_submitting_replaces(tmp_path):
+    """A second reading of the day is sent as a replacement, not an insert."""
+
+    async def _async_test() -> None:
+        hass = await async_hass(str(tmp_path))
+        client = FakeClient()
+        outbox = MyLuminusOutbox(hass, client, "entry")
+
+        client.answer.clear()
+        outbox.async_enqueue(EAN, DAY, {"Value": 1})
+        await asyncio.sleep(0)
+        # the first reading is on its way when the second one comes in
+        outbox.async_enqueue(EAN, DAY, {"Value": 2})
+        client.answer.set()
+        await outbox._flush_task
+
+        assert client.calls == [
+            ("insert", 1),
+            ("delete", DAY.isoformat()),
+            ("insert", 2),
+        ]
+        assert client.readings[(EAN, DAY.isoformat())]["Value"] == 2
+        assert outbox.pending == 0
+        await outbox.async_shutdown()
+        await hass.async_stop(force=True)
+
+    asyncio.run(_async_test())
+
+
+def test_failed_insert_after_delete_is_retried_without_delete(tmp_path):
+    """The old reading is deleted once, a retry only inserts."""
+
+    async def _async_test() -> None:
+        hass = await async_hass(str(tmp_path))
+        client = FakeClient()
+        outbox = MyLuminusOutbox(hass, client, "entry")
+
+        outbox.async_enqueue(EAN, DAY, {"Value": 1})
+        await outbox._flush_task
+        client.failures = 1
+        outbox.async_enqueue(EAN, DAY, {"Value": 2})
+        await outbox._flush_task
+        assert outbox.pending == 1
+
+        outbox.async_schedule_flush()
+        await outbox._flush_task
+
+        assert client.calls == [
+            ("insert", 1),
+            ("delete", DAY.isoformat()),
+            ("insert", 2),
+            ("insert", 2),
+        ]
+        assert outbox.pending == 0
+        await outbox.async_shutdown()
+        await hass.async_stop(force=True)
+
+    asyncio.run(_async_test())
@@ -0,0 +1,73 @@
+"""Tests for the memory mapped consumption series."""
+import pytest
+
+from custom_components.my_luminus_integration.timeseries import (
+    MyLuminusSeriesClosedError,
+    MyLuminusSeriesStore,
+    MyLuminusTimeSeries,
+)
+
+DAY = 86400
+
+
+def _days(first: int, count: int) -> list[tuple[int, int, float]]:
+    """Daily (start, end, value) rows, the value is the day number."""
+    return [
+        (day * DAY, (day + 1) * DAY, float(day)) for day in range(first, first + count)
+    ]
+
+
+def test_extend_after_close_is_refused(tmp_path):
+    """A closed series keeps its files as they are."""
+    series = MyLuminusTimeSeries(str(tmp_path / "meter"))
+    series.open()
+    series.extend(_days(1, 10))
+    series.close()
+
+    with pytest.raises(MyLuminusSeriesClosedError):
+        series.extend(_days(20, 1))
+
+    series.open()
+    assert series.start.tolist() == [day * DAY for day in range(1, 11)]
+    assert series.running_totals(len(series)) == (55.0, 10 * DAY)
+    series.close()
+
+
+def test_extend_before_open_is_refused(tmp_path):
+    """Nothing is written before the files are mapped."""
+    series = MyLuminusTimeSeries(str(tmp_path / "meter"))
+    with pytest.raises(MyLuminusSeriesClosedError):
+        series.extend(_days(1, 1))
+
+
+def test_closing_the_store_closes_its_series(tmp_path):
+    """Series handed out by a closed store refuse writes too."""
+    store = MyLuminusSeriesStore(str(tmp_path))
+    series, created = store.get("5414488200000000", "Electricity", "Day")
+    assert created
+    series.extend(_days(1, 3))
+    store.close()
+
+    with pytest.raises(MyLuminusSeriesClosedError):
+        series.extend(_days(4, 1))
+
+    series, created = store.get("5414488200000000", "Electricity", "Day")
+    assert not created
+    assert series.last() == (3 * DAY, 4 * DAY, 3.0)
+    store.close()
+
+
+def test_snapshot_taken_before_extend_stays_consistent(tmp_path):
+    """Readers holding the arrays of before an extend see matching lengths."""
+    series = MyLuminusTimeSeries(str(tmp_path / "meter"))
+    series.open()
+    series.extend(_days(1, 3))
+    start, records = series.arrays
+    series.extend(_days(4, 2))
+
+    assert len(start) == len(records) == 3
+    assert float(records[-1]["cumulative"]) == 6.0
+    consumption, covered = series.totals([[0, 10 * DAY]])
+    assert consumption.tolist() == [15.0]
+    assert covered.tolist() == [5 * DAY]
+    series.close()